@@ -1,5 +1,5 @@
 """
-Django settings for films project.
+Django settings for films project, shared by the dev/prod/test profiles.
 
 Generated by 'django-admin startproject' using Django 4.2.
 
@@ -31,7 +31,7 @@ env = environ.Env(
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
 # Take environment variables from .env file
 environ.Env.read_env(BASE_DIR / '.env')
@@ -43,7 +43,7 @@ environ.Env.read_env(BASE_DIR / '.env')
 SECRET_KEY = env('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = env('DEBUG')
+DEBUG = env('DEBUG', default=False)
 
 ALLOWED_HOSTS = []
 
@@ -58,19 +58,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-
-    'django_extensions',
-    'debug_toolbar',
+    'django.contrib.postgres',
 
     # User
     'movie',
 ]
 
-INTERNAL_IPS = [
-        "127.0.0.1",
-    ]
-
 MIDDLEWARE = [
+    'movie.perf.PerformanceMiddleware',
+    'movie.querycheck.QueryDetectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,9 +74,6 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
-    'debug_toolbar_force.middleware.ForceDebugToolbarMiddleware',
 ]
 
 ROOT_URLCONF = 'films.urls'
@@ -162,11 +155,66 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# JSON rendering/parsing: 'fast' - movie.renderers (orjson when installed, stdlib json otherwise),
+# 'stdlib' - DRF's own JSONRenderer/JSONParser
+JSON_BACKEND = env.str('JSON_BACKEND', default='fast')
+JSON_CLASSES = {
+    'fast': ('movie.renderers.FastJSONRenderer', 'movie.renderers.FastJSONParser'),
+    'stdlib': ('rest_framework.renderers.JSONRenderer', 'rest_framework.parsers.JSONParser'),
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        JSON_CLASSES[JSON_BACKEND][0],
     ),
     'DEFAULT_PARSER_CLASSES': (
-        'rest_framework.parsers.JSONParser',
+        JSON_CLASSES[JSON_BACKEND][1],
     ),
-}
\ No newline at end of file
+    'DEFAULT_PAGINATION_CLASS': 'movie.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+}
+
+# How UserMovieRelation writes reach the Movie counters and rating:
+# 'sync' - one delta UPDATE per save, 'on_commit' - batched when the transaction commits,
+# 'queue' - recorded in PendingRating and applied by `manage.py flush_pending_ratings`
+MOVIE_RATING_UPDATES = env.str('MOVIE_RATING_UPDATES', default='sync')
+
+# Anonymous GET /movie/ and /movie/<id>/ responses, invalidated on every movie/relation write
+MOVIE_CACHE_ALIAS = 'default'
+MOVIE_CACHE_TIMEOUT = 60
+# Leaderboards (movie.rankings): positions kept per board, votes a top-rated movie needs before its own
+# average outweighs the catalogue mean, and the trending window
+MOVIE_LEADERBOARD_SIZE = 1000
+MOVIE_LEADERBOARD_MIN_VOTES = 10
+MOVIE_TRENDING_DAYS = 7
+
+# Fraction of requests measured by movie.perf.PerformanceMiddleware (JSON log line on `movie.perf`
+# and a Server-Timing header); 0 removes the middleware
+PERF_SAMPLE_RATE = env.float('PERF_SAMPLE_RATE', default=0.0)
+
+# Log-only N+1/slow query detection per request (movie.querycheck), warnings on `movie.queries`
+QUERY_DETECTOR = env.bool('QUERY_DETECTOR', default=False)
+QUERY_DETECTOR_REPEAT_THRESHOLD = 5
+QUERY_DETECTOR_SLOW_MS = 100
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'movie.perf': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'movie.queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
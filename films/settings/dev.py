@@ -0,0 +1,20 @@
+"""Local development: DEBUG, django-extensions and the (forced) debug toolbar"""
+
+from .base import *  # noqa: F401,F403
+from .base import INSTALLED_APPS, MIDDLEWARE, env
+
+DEBUG = env('DEBUG', default=True)
+
+INSTALLED_APPS = INSTALLED_APPS + [
+    'django_extensions',
+    'debug_toolbar',
+]
+
+INTERNAL_IPS = [
+    '127.0.0.1',
+]
+
+MIDDLEWARE = MIDDLEWARE + [
+    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'debug_toolbar_force.middleware.ForceDebugToolbarMiddleware',
+]
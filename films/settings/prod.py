@@ -0,0 +1,23 @@
+"""Production: no debug apps/middleware, persistent DB connections, cached templates"""
+
+from urllib.parse import urlsplit
+
+from .base import *  # noqa: F401,F403
+from .base import DATABASES, DOMAIN_NAME, TEMPLATES, env
+
+DEBUG = False
+
+ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', default=[urlsplit(DOMAIN_NAME).hostname or DOMAIN_NAME])
+
+# Keep PostgreSQL connections across requests; a connection that went away is replaced
+# before the request uses it instead of failing it
+DATABASES['default']['CONN_MAX_AGE'] = env.int('CONN_MAX_AGE', default=60)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
@@ -0,0 +1,26 @@
+"""Test suite: in-memory SQLite, runs without a .env or a PostgreSQL server"""
+
+import os
+
+for name, value in (('SECRET_KEY', 'test'), ('DOMAIN_NAME', 'http://testserver'), ('DATABASE_NAME', ''),
+                    ('DATABASE_USER', ''), ('DATABASE_PASSWORD', ''), ('DATABASE_HOST', ''),
+                    ('DATABASE_PORT', '')):
+    os.environ.setdefault(name, value)
+
+from .base import *  # noqa: E402,F401,F403
+
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+# The repository ships no migrations for `movie`: create its tables straight from the models
+MIGRATION_MODULES = {'movie': None}
+
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
@@ -20,6 +20,7 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import SimpleRouter
 
+from movie.async_views import movie_detail, movie_list
 from movie.views import MovieViewSet, UserMoviesRelationView
 
 router = SimpleRouter()
@@ -29,9 +30,11 @@ router.register(r'movie_relation', UserMoviesRelationView)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('async/movie/', movie_list, name='async-movie-list'),
+    path('async/movie/<int:pk>/', movie_detail, name='async-movie-detail'),
 ]
 
 urlpatterns += router.urls
 
-if settings.DEBUG:
+if 'debug_toolbar' in settings.INSTALLED_APPS:
     urlpatterns.append(path('__debug__/', include('debug_toolbar.urls')))
@@ -17,4 +17,5 @@ class MovieAdmin(ModelAdmin):
 
 @admin.register(UserMovieRelation)
 class UserMovieRelationAdmin(ModelAdmin):
-    pass
\ No newline at end of file
+    # __str__ reads user.username and movie.title
+    list_select_related = ('user', 'movie')
\ No newline at end of file
@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, pre_delete
 
 
 class MovieConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'movie'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+
+        from movie.search import install_search_ddl
+        from movie.utils import rebuild_user_movies, remember_user_movies
+        post_migrate.connect(install_search_ddl, sender=self)
+        # Deleting a user cascades to their relations without UserMovieRelation.delete
+        pre_delete.connect(remember_user_movies, sender=User)
+        post_delete.connect(rebuild_user_movies, sender=User)
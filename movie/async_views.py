@@ -0,0 +1,75 @@
+"""
+Native async read endpoints for ASGI deployments, mounted under /async/ next to the router.
+They answer like MovieViewSet's list/detail (same JSON) on the async ORM, without a thread
+hop per request. Search, ordering, the response cache and ETags stay on the DRF views.
+"""
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+
+from movie.models import RATE_CHOICES, Movie, rate_count_field
+from movie.pagination import KeysetPagination
+from movie.renderers import FastJSONRenderer
+from movie.serializers import MovieRowSerializer
+from movie.utils import annotate_user_flags
+from movie.views import MovieViewSet
+
+
+def get_readers_limit(request):
+    try:
+        limit = int(request.GET[MovieViewSet.readers_limit_query_param])
+    except (KeyError, ValueError):
+        return MovieViewSet.readers_limit
+    return min(max(limit, 0), MovieViewSet.max_readers_limit)
+
+
+async def get_queryset(request):
+    # request.user is lazy and may read the session and user tables: evaluate it off the event loop
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return annotate_user_flags(MovieViewSet.queryset.all(), request.user)
+
+
+def json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+async def movie_list(request):
+    """GET /async/movie/ with the `year` filter, keyset `cursor`/`page_size` and `readers_limit`"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    queryset = await get_queryset(request)
+    if request.GET.get('year'):
+        try:
+            queryset = queryset.filter(year=int(request.GET['year']))
+        except ValueError:
+            return json_response({'year': ['Enter a number.']}, status=400)
+
+    paginator = KeysetPagination()
+    try:
+        page = await paginator.apaginate_queryset(MovieRowSerializer.rows(queryset), Request(request))
+    except NotFound as exc:
+        return json_response({'detail': exc.detail}, status=404)
+    results = await MovieRowSerializer(page, readers_limit=get_readers_limit(request)).adata()
+    return json_response({
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+        'results': results,
+    })
+
+
+async def movie_detail(request, pk):
+    """GET /async/movie/<pk>/"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    try:
+        row = await MovieRowSerializer.rows(await get_queryset(request), extra=Movie.RATE_COUNT_FIELDS).aget(pk=pk)
+    except Movie.DoesNotExist:
+        return json_response({'detail': 'Not found.'}, status=404)
+    data = (await MovieRowSerializer([row], readers_limit=get_readers_limit(request)).adata())[0]
+    # MovieDetailSerializer's extra field
+    data['rating_histogram'] = {str(rate): row[rate_count_field(rate)] for rate, _ in RATE_CHOICES}
+    return json_response(data)
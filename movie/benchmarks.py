@@ -0,0 +1,121 @@
+import random
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from movie.models import Movie, UserMovieRelation
+from movie.utils import rebuild_counters
+
+WORDS = (
+    'king', 'purpose', 'glorious', 'holiday', 'season', 'gift', 'bow', 'hail', 'marvel', 'shot',
+    'night', 'shadow', 'return', 'empire', 'star', 'war', 'love', 'city', 'dark', 'light',
+    'stranger', 'things', 'ghost', 'river', 'winter', 'summer', 'dream', 'last', 'first', 'secret',
+    'storm', 'iron', 'hawk', 'eye', 'loki', 'thunder', 'queen', 'road', 'home', 'lost',
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def scratch_data():
+    """Everything seeded inside the block is rolled back on exit"""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def random_text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def seed_movies(count, batch_size=2000, seed=0):
+    rng = random.Random(seed)
+    for start in range(0, count, batch_size):
+        Movie.objects.bulk_create([
+            Movie(title=random_text(rng, rng.randint(1, 4)), tagline=random_text(rng, rng.randint(3, 8)),
+                  year=rng.randint(1950, 2023))
+            for _ in range(min(batch_size, count - start))
+        ])
+
+
+def seed_users(count, prefix='bench-user'):
+    return User.objects.bulk_create([User(username=f'{prefix}-{index}', email=f'{prefix}-{index}@example.com')
+                                     for index in range(count)])
+
+
+def seed_relations(users, per_user, batch_size=2000, seed=0, days=0):
+    """
+    `per_user` random relations for each user (likes, bookmarks and rates), then the movie counters.
+    Inserted batch by batch, so a million relations don't sit in memory; with `days`, each batch
+    gets an `updated_at` (and `liked_at` for likes) somewhere in that many past days.
+    """
+    rng = random.Random(seed)
+    movie_ids = list(Movie.objects.values_list('id', flat=True))
+    now = timezone.now()
+
+    def insert(relations):
+        stamp = now - timedelta(seconds=rng.uniform(0, days * 86400)) if days else now
+        for relation in relations:
+            relation.liked_at = stamp if relation.like else None
+        relations = UserMovieRelation.objects.bulk_create(relations)
+        # bulk_create applies auto_now, so the spread is a second statement over the batch's ids
+        if days and relations:
+            UserMovieRelation.objects.filter(id__gte=relations[0].pk, id__lte=relations[-1].pk).update(
+                updated_at=stamp)
+
+    relations = []
+    for user in users:
+        for movie_id in rng.sample(movie_ids, min(per_user, len(movie_ids))):
+            relations.append(UserMovieRelation(user=user, movie_id=movie_id, like=rng.random() < 0.5,
+                                               in_bookmarks=rng.random() < 0.2,
+                                               rate=rng.choice((None, 1, 2, 3, 4, 5))))
+            if len(relations) >= batch_size:
+                insert(relations)
+                relations = []
+    insert(relations)
+    rebuild_counters()
+
+
+def measure(func, repeat=20):
+    """Run `func` `repeat` times, timings in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'p50': statistics.median(timings),
+        'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'mean': statistics.fmean(timings),
+    }
+
+
+def profile(func, repeat=20):
+    """
+    measure() timings plus the queries of one call and its peak traced memory in KiB
+    (traced on a separate call, tracemalloc would skew the timings)
+    """
+    func()
+    queries = []
+    # An execute wrapper rather than CaptureQueriesContext: request_started resets connection.queries
+    with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+        func()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'queries': len(queries), **measure(func, repeat), 'peak_kib': peak / 1024}
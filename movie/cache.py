@@ -0,0 +1,193 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'movie:version'
+HITS_KEY = 'movie:stats:hits'
+MISSES_KEY = 'movie:stats:misses'
+
+
+def get_cache():
+    return caches[getattr(settings, 'MOVIE_CACHE_ALIAS', 'default')]
+
+
+def get_version():
+    # Seeded from the clock, so a version lost to eviction never goes back to a value already used
+    cache = get_cache()
+    cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+    return cache.get(VERSION_KEY)
+
+
+def bump_version():
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        get_version()
+
+
+def invalidate():
+    """Drop every cached movie response: now, and again once the current transaction commits"""
+    bump_version()
+    transaction.on_commit(bump_version)
+
+
+def cache_stats():
+    cache = get_cache()
+    return {'hits': cache.get(HITS_KEY, 0), 'misses': cache.get(MISSES_KEY, 0)}
+
+
+def _count(key):
+    cache = get_cache()
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def make_key(request, action, **kwargs):
+    params = sorted((key, value) for key, values in request.query_params.lists()
+                    for value in values if value != '')
+    raw = repr((request.get_host(), action, sorted(kwargs.items()), params))
+    return f'movie:{get_version()}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+class CachedResponseMixin:
+    """
+    Caches list/retrieve responses of anonymous users, keyed by the normalized query
+    parameters and the global movie version bumped on every Movie/UserMovieRelation write
+    """
+
+    @property
+    def cache_timeout(self):
+        # Read per request, so settings overrides apply
+        return getattr(settings, 'MOVIE_CACHE_TIMEOUT', 60)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = make_key(request, self.action, **kwargs)
+        cached = cache.get(key)
+        if cached is not None:
+            _count(HITS_KEY)
+            data, headers = cached
+            # The entry is only reachable while nothing changed, so its validators are still current
+            last_modified = headers.get('Last-Modified')
+            not_modified = get_conditional_response(request, etag=headers.get('ETag'),
+                                                    last_modified=last_modified and parse_http_date(last_modified))
+            if not_modified is not None:
+                return not_modified
+            return Response(data, headers={**headers, 'X-Cache': 'HIT'})
+
+        _count(MISSES_KEY)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            headers = {name: response[name] for name in ('ETag', 'Last-Modified', 'Vary')
+                       if response.has_header(name)}
+            cache.set(key, (response.data, headers), self.cache_timeout)
+            response['X-Cache'] = 'MISS'
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag for list/retrieve, plus Last-Modified for retrieve. A conditional request is answered
+    from `id, updated_at` of the requested page (or object) alone, without the prefetch
+    and the serializer; a 304 is returned when nothing on it changed. ETags include
+    the requesting user, whose own flags are part of the representation.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if self.is_conditional(request):
+            queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+            paginator = self.pagination_class()
+            paginator.paginate_queryset(queryset.only(*self.validator_fields(queryset)), request, view=self)
+            not_modified = get_conditional_response(request, *self.page_validators(paginator,
+                                                                                    self.validator_salt()))
+            if not_modified is not None:
+                return not_modified
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK and self.paginator is not None:
+            self.set_validators(response, *self.page_validators(self.paginator, self.validator_salt()))
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.is_conditional(request):
+            lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+            try:
+                updated_at = self.get_queryset().prefetch_related(None).filter(
+                    **{self.lookup_field: lookup}).values_list('updated_at', flat=True).first()
+            except (TypeError, ValueError, ValidationError):
+                # Not a valid key: the regular path answers 404 like get_object_or_404 does
+                updated_at = None
+            if updated_at is not None:
+                not_modified = get_conditional_response(request, *self.object_validators(
+                    lookup, updated_at, self.validator_salt()))
+                if not_modified is not None:
+                    return not_modified
+
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            self.set_validators(response, *self.object_validators(self._validated_object.pk,
+                                                                  self._validated_object.updated_at,
+                                                                  self.validator_salt()))
+        return response
+
+    def get_object(self):
+        self._validated_object = super().get_object()
+        return self._validated_object
+
+    def validator_salt(self):
+        user = self.request.user
+        return f'user:{user.pk}' if user.is_authenticated else ''
+
+    @staticmethod
+    def is_conditional(request):
+        return 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+
+    @staticmethod
+    def validator_fields(queryset):
+        names = {field.name for field in queryset.model._meta.concrete_fields}
+        ordering = {field.lstrip('-') for field in queryset.query.order_by if isinstance(field, str)}
+        return {'id', 'updated_at'} | (ordering & names)
+
+    @staticmethod
+    def page_validators(paginator, salt=''):
+        # Page rows are model instances or values() dicts
+        versions = [(obj['id'], obj['updated_at']) if isinstance(obj, dict) else (obj.pk, obj.updated_at)
+                    for obj in paginator.page]
+        rows = [f'{pk}:{updated_at.timestamp()}' for pk, updated_at in versions]
+        rows.append(f'{paginator.has_next}:{paginator.has_previous}:{salt}')
+        etag = '"%s"' % hashlib.md5(';'.join(rows).encode()).hexdigest()
+        # No Last-Modified: a row deleted from the page, or moving out of it, doesn't raise the newest updated_at
+        return etag, None
+
+    @staticmethod
+    def object_validators(pk, updated_at, salt=''):
+        etag = '"%s"' % hashlib.md5(f'{pk}:{updated_at.timestamp()}:{salt}'.encode()).hexdigest()
+        return etag, int(updated_at.timestamp())
+
+    @staticmethod
+    def set_validators(response, etag, last_modified):
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Authorization', 'Cookie'])
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
@@ -0,0 +1,29 @@
+from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.settings import api_settings
+
+from movie.search import full_text_search
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    `?search=` backed by PostgreSQL full-text search (an in-process inverted index elsewhere).
+    `search_rank` is annotated when the client orders by it.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM, '')
+        return full_text_search(queryset, terms, rank='search_rank' in ordering)
+
+
+class AnnotationOrderingFilter(OrderingFilter):
+    """Drops ordering by `annotation_ordering_fields` the queryset wasn't annotated with (e.g. rank without search)"""
+    annotation_ordering_fields = ('search_rank',)
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        valid = super().remove_invalid_fields(queryset, fields, view, request)
+        return [term for term in valid
+                if term.lstrip('-') not in self.annotation_ordering_fields
+                or term.lstrip('-') in queryset.query.annotations]
@@ -0,0 +1,113 @@
+import json
+import os
+from itertools import cycle
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from movie.benchmarks import profile, scratch_data, seed_movies, seed_relations, seed_users
+from movie.models import Movie
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, 'benchmark_baseline.json')
+
+
+class Command(BaseCommand):
+    help = ('Query counts, p50/p95 latency and peak memory of the movie API on seeded data (rolled back), '
+            'compared with a stored baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--relations', type=int, default=20, help='Relations per user')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--baseline', default=os.path.normpath(DEFAULT_BASELINE))
+        parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Allowed latency/memory growth over the baseline, as a fraction')
+        parser.add_argument('--slack-ms', type=float, default=2.0,
+                            help='Latency growth always allowed, so sub-millisecond noise never fails')
+
+    def handle(self, *args, movies, users, relations, repeat, baseline, save_baseline, tolerance, slack_ms,
+               **options):
+        meta = {'vendor': connection.vendor, 'movies': movies, 'users': users, 'relations': relations}
+        with scratch_data(), override_settings(ALLOWED_HOSTS=['testserver']):
+            seed_movies(movies)
+            seeded_users = seed_users(users)
+            seed_relations(seeded_users, relations)
+            results = {name: profile(request, repeat) for name, request in self.scenarios(seeded_users[0])}
+
+        self.stdout.write(f'{movies} movies x {users} users x {relations} relations on {connection.vendor}')
+        for name, result in results.items():
+            self.stdout.write(f'{name:>16}: {result["queries"]:3} queries  p50 {result["p50"]:8.2f} ms  '
+                              f'p95 {result["p95"]:8.2f} ms  peak {result["peak_kib"]:9.1f} KiB')
+
+        if save_baseline:
+            with open(baseline, 'w') as file:
+                json.dump({'meta': meta, 'scenarios': results}, file, indent=2, sort_keys=True)
+                file.write('\n')
+            self.stdout.write(f'Baseline written to {baseline}')
+            return
+
+        if not os.path.exists(baseline):
+            self.stderr.write(f'No baseline at {baseline}, run with --save-baseline first')
+            return
+        with open(baseline) as file:
+            stored = json.load(file)
+
+        # Timings and memory only compare on the same database and data size; query counts always do
+        timed = stored['meta'] == meta
+        if not timed:
+            self.stderr.write(f'Baseline was recorded for {stored["meta"]}, comparing query counts only')
+        regressions = self.compare(stored['scenarios'], results, timed, tolerance, slack_ms)
+        if regressions:
+            raise CommandError('Regressions over the baseline:\n' + '\n'.join(regressions))
+        self.stdout.write('No regressions')
+
+    @staticmethod
+    def scenarios(user):
+        client = APIClient()
+        client.force_authenticate(user)
+        movie = Movie.objects.order_by('id').first()
+        list_url = reverse('movie-list')
+        relation_url = reverse('usermovierelation-detail', args=(movie.id,))
+        likes = cycle((True, False))
+
+        def get(url, data=None):
+            def request():
+                response = client.get(url, data)
+                assert response.status_code == 200, response.status_code
+            return request
+
+        def patch():
+            response = client.patch(relation_url, {'like': next(likes), 'rate': 4}, format='json')
+            assert response.status_code == 200, response.status_code
+
+        return [
+            ('list', get(list_url)),
+            ('detail', get(reverse('movie-detail', args=(movie.id,)))),
+            ('filter', get(list_url, {'year': 2021})),
+            ('search', get(list_url, {'search': 'king'})),
+            ('ordering', get(list_url, {'ordering': '-year'})),
+            ('relation-patch', patch),
+        ]
+
+    @staticmethod
+    def compare(stored, results, timed, tolerance, slack_ms):
+        regressions = []
+        for name, result in results.items():
+            if name not in stored:
+                continue
+            before = stored[name]
+            if result['queries'] > before['queries']:
+                regressions.append(f'{name}: {before["queries"]} -> {result["queries"]} queries')
+            if not timed:
+                continue
+            for metric in ('p50', 'p95'):
+                if result[metric] > before[metric] * (1 + tolerance) + slack_ms:
+                    regressions.append(f'{name}: {metric} {before[metric]:.2f} -> {result[metric]:.2f} ms')
+            if result['peak_kib'] > before['peak_kib'] * (1 + tolerance):
+                regressions.append(f'{name}: peak memory {before["peak_kib"]:.1f} -> {result["peak_kib"]:.1f} KiB')
+        return regressions
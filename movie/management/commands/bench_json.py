@@ -0,0 +1,58 @@
+import datetime
+import random
+from decimal import Decimal
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from movie import renderers
+from movie.benchmarks import WORDS, measure
+from movie.renderers import FastJSONParser, FastJSONRenderer
+
+
+def synthetic_movies(count, seed=0):
+    """Movie list payload shaped like MoviesSerializer output, plus a Decimal and a datetime per item"""
+    rng = random.Random(seed)
+    updated = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+    return [{
+        'id': index,
+        'title': ' '.join(rng.choices(WORDS, k=3)).capitalize(),
+        'tagline': ' '.join(rng.choices(WORDS, k=6)),
+        'description': None,
+        'year': rng.randint(1950, 2023),
+        'readers': [{'username': f'user{i}', 'email': f'user{i}@gmail.com'} for i in range(rng.randint(0, 5))],
+        'readers_count': rng.randint(0, 500),
+        'annotated_likes': rng.randint(0, 500),
+        'rating': Decimal(rng.randint(100, 500)) / 100,
+        'updated_at': updated + datetime.timedelta(seconds=index),
+    } for index in range(count)]
+
+
+class Command(BaseCommand):
+    help = 'Render/parse synthetic movie lists with the stdlib and the fast JSON renderer/parser'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, sizes, repeat, **options):
+        if renderers.orjson is None:
+            self.stderr.write('orjson is not installed, the fast renderer falls back to the stdlib')
+
+        for size in sizes:
+            data = synthetic_movies(size)
+            body = JSONRenderer().render(data)
+            if FastJSONRenderer().render(data) != body:
+                self.stderr.write(f'{size}: rendered bytes differ')
+
+            results = {
+                'render stdlib': measure(lambda: JSONRenderer().render(data), repeat),
+                'render fast': measure(lambda: FastJSONRenderer().render(data), repeat),
+                'parse stdlib': measure(lambda: JSONParser().parse(BytesIO(body)), repeat),
+                'parse fast': measure(lambda: FastJSONParser().parse(BytesIO(body)), repeat),
+            }
+            self.stdout.write(f'{size} movies, {len(body) / 1024:.0f} KiB')
+            for name, timing in results.items():
+                self.stdout.write(f'{name:>14}: p50 {timing["p50"]:9.2f} ms  p95 {timing["p95"]:9.2f} ms')
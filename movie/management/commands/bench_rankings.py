@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Avg
+
+from movie.benchmarks import measure, scratch_data, seed_movies, seed_relations, seed_users
+from movie.models import MovieRanking, UserMovieRelation
+from movie.rankings import BOARDS, refresh_rankings
+
+
+class Command(BaseCommand):
+    help = ('Leaderboard page reads from the ranking table vs aggregating UserMovieRelation per request, '
+            'and the refresh cost, on seeded data (rolled back)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=20000)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--relations', type=int, default=100, help='Relations per user')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=20)
+
+    def handle(self, *args, movies, users, relations, repeat, page_size, **options):
+        with scratch_data():
+            started = time.perf_counter()
+            seed_movies(movies)
+            seed_relations(seed_users(users), relations, days=30)
+            self.stdout.write(f'{movies} movies, {UserMovieRelation.objects.count()} relations on '
+                              f'{connection.vendor}, seeded in {time.perf_counter() - started:.1f} s')
+
+            for board in BOARDS:
+                started = time.perf_counter()
+                refresh_rankings([board])
+                self.stdout.write(f'refresh {board:>10}: {(time.perf_counter() - started) * 1000:9.1f} ms')
+
+            def ranking_page():
+                return list(MovieRanking.objects.filter(board='top_rated', position__gt=page_size * 10)
+                            .select_related('movie').order_by('position')[:page_size])
+
+            def aggregate_page():
+                return list(UserMovieRelation.objects.filter(rate__isnull=False).values('movie_id')
+                            .annotate(average=Avg('rate')).order_by('-average', 'movie_id')
+                            [page_size * 10:page_size * 11])
+
+            for name, func in (('ranking table', ranking_page), ('aggregate', aggregate_page)):
+                timing = measure(func, repeat)
+                self.stdout.write(f'{name:>18}: p50 {timing["p50"]:9.2f} ms  p95 {timing["p95"]:9.2f} ms')
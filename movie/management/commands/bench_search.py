@@ -0,0 +1,44 @@
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from movie.benchmarks import measure, scratch_data, seed_movies
+from movie.models import Movie
+from movie.search import full_text_search
+
+
+class Command(BaseCommand):
+    help = 'Compare the icontains SearchFilter query with full-text search on seeded movies (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--terms', nargs='+', default=['king', 'holiday season', 'dark empire'])
+
+    def handle(self, *args, movies, repeat, terms, **options):
+        with scratch_data():
+            seed_movies(movies)
+            self.stdout.write(f'{movies} movies on {connection.vendor}')
+            for term in terms:
+                words = term.split()
+                # What rest_framework.filters.SearchFilter builds for search_fields = ['title', 'tagline']
+                icontains = Movie.objects.all()
+                for word in words:
+                    icontains = icontains.filter(reduce(or_, [Q(title__icontains=word), Q(tagline__icontains=word)]))
+
+                # The first full-text call also builds the in-process index where PostgreSQL isn't used
+                full_text_search(Movie.objects.all(), words).count()
+
+                results = {
+                    'icontains': measure(lambda: list(icontains.order_by('id').values_list('id', flat=True)), repeat),
+                    'full-text': measure(lambda: list(full_text_search(Movie.objects.all(), words, rank=False)
+                                                      .order_by('id').values_list('id', flat=True)), repeat),
+                    'ranked': measure(lambda: list(full_text_search(Movie.objects.all(), words)
+                                                   .order_by('-search_rank').values_list('id', flat=True)), repeat),
+                }
+                for name, timing in results.items():
+                    self.stdout.write(f'{term!r:>16} {name:>10}: p50 {timing["p50"]:8.2f} ms  '
+                                      f'p95 {timing["p95"]:8.2f} ms')
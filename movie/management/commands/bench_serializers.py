@@ -0,0 +1,44 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from movie.benchmarks import measure, scratch_data, seed_movies
+from movie.models import Movie, UserMovieRelation
+from movie.serializers import MovieRowSerializer, MoviesSerializer
+
+
+class Command(BaseCommand):
+    help = 'Per-object cost of MoviesSerializer vs MovieRowSerializer on seeded movies (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=1000)
+        parser.add_argument('--readers', type=int, default=5, help='Readers per movie')
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, movies, readers, repeat, **options):
+        with scratch_data():
+            seed_movies(movies)
+            users = User.objects.bulk_create([User(username=f'bench-reader-{i}') for i in range(readers)])
+            UserMovieRelation.objects.bulk_create([
+                UserMovieRelation(user=user, movie_id=movie_id)
+                for movie_id in Movie.objects.values_list('id', flat=True) for user in users
+            ], batch_size=2000)
+
+            queryset = Movie.objects.defer('search_vector').order_by('id')
+            renderer = JSONRenderer()
+
+            def serializer():
+                return renderer.render(MoviesSerializer(queryset.prefetch_related('readers'), many=True).data)
+
+            def rows():
+                return renderer.render(MovieRowSerializer(MovieRowSerializer.rows(queryset)).data)
+
+            if serializer() != rows():
+                self.stderr.write('Outputs differ')
+
+            self.stdout.write(f'{movies} movies x {readers} readers on {connection.vendor}')
+            for name, func in (('serializer', serializer), ('values rows', rows)):
+                timing = measure(func, repeat)
+                self.stdout.write(f'{name:>12}: p50 {timing["p50"]:8.2f} ms  p95 {timing["p95"]:8.2f} ms  '
+                                  f'{timing["p50"] * 1000 / movies:7.2f} us/object')
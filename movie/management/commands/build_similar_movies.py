@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movie import similarity
+
+
+class Command(BaseCommand):
+    help = 'Build the top-K similar movies table from UserMovieRelation (needs NumPy and SciPy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--changed', action='store_true',
+                            help='Only movies whose relations changed since the last build (and their listers)')
+        parser.add_argument('--movie', type=int, nargs='+', dest='movie_ids', help='Only these movie ids')
+        parser.add_argument('-k', type=int, default=20, help='Neighbours kept per movie')
+        parser.add_argument('--block-size', type=int, default=256)
+
+    def handle(self, *args, changed, movie_ids, k, block_size, **options):
+        if similarity.np is None:
+            raise CommandError('NumPy and SciPy are required: pip install numpy scipy')
+
+        if changed:
+            movie_ids = similarity.changed_movies()
+            if movie_ids is not None and not movie_ids:
+                self.stdout.write('No changes since the last build')
+                return
+        written = similarity.build_similarities(movie_ids, k=k, block_size=block_size)
+        self.stdout.write(self.style.SUCCESS(f'Similar movies built for {written} movies'))
@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter per profile, so imports and app loading are part of the startup time
+PROBE = '''
+import json, statistics, sys, time
+started = time.perf_counter()
+import django
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+startup = time.perf_counter() - started
+
+from django.conf import settings
+from django.test import Client
+settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+client = Client()
+url, count = sys.argv[1], int(sys.argv[2])
+client.options(url)
+timings = []
+for _ in range(count):
+    started = time.perf_counter()
+    client.options(url)
+    timings.append((time.perf_counter() - started) * 1000)
+timings.sort()
+print(json.dumps({'startup_ms': startup * 1000, 'p50': statistics.median(timings),
+                  'p95': timings[min(count - 1, int(count * 0.95))], 'middleware': len(settings.MIDDLEWARE),
+                  'apps': len(settings.INSTALLED_APPS)}))
+'''
+
+
+class Command(BaseCommand):
+    help = ('Startup time and per-request overhead of the settings profiles, each in its own interpreter. '
+            'Requests are `OPTIONS` on the movie list, which runs the middleware and DRF stack without the database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', default=['dev', 'prod', 'test'])
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--url', default='/movie/')
+
+    def handle(self, *args, profiles, requests, url, **options):
+        for profile in profiles:
+            environment = {**os.environ, 'DJANGO_SETTINGS_MODULE': f'films.settings.{profile}'}
+            result = subprocess.run([sys.executable, '-c', PROBE, url, str(requests)], env=environment,
+                                    cwd=settings.BASE_DIR, capture_output=True, text=True)
+            if result.returncode:
+                raise CommandError(f'{profile}: {result.stderr.strip().splitlines()[-1]}')
+            timing = json.loads(result.stdout.strip().splitlines()[-1])
+            self.stdout.write(f'{profile:>6}: startup {timing["startup_ms"]:8.1f} ms  '
+                              f'request p50 {timing["p50"]:6.2f} ms  p95 {timing["p95"]:6.2f} ms  '
+                              f'({timing["apps"]} apps, {timing["middleware"]} middleware)')
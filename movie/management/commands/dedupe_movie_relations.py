@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from movie.utils import dedupe_relations
+
+
+class Command(BaseCommand):
+    help = ('Merge duplicate (user, movie) UserMovieRelation rows; run before the migration adding the unique '
+            'constraint, then rebuild_movie_counters once migrated')
+
+    def handle(self, *args, **options):
+        removed = dedupe_relations()
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} duplicate relations'))
+        if removed:
+            self.stdout.write('Run `manage.py rebuild_movie_counters` once migrated')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from movie.models import Movie, UserMovieRelation
+from movie.transfer import FORMATS, MOVIE_FIELDS, RELATION_FIELDS, Progress, counted, guess_format, open_file, \
+    write_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream movies (and optionally user relations) to CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Movies file, "-" for stdout')
+        parser.add_argument('--relations', help='Also export UserMovieRelation rows to this file')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension, else jsonl')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, path, relations=None, format=None, batch_size=2000, **options):
+        rows = Movie.objects.order_by('id').values_list(*MOVIE_FIELDS).iterator(chunk_size=batch_size)
+        self._export(path, format, MOVIE_FIELDS, rows, 'movies')
+
+        if relations:
+            rows = UserMovieRelation.objects.order_by('id').values_list(
+                'user__username', 'movie_id', 'like', 'in_bookmarks', 'rate').iterator(chunk_size=batch_size)
+            self._export(relations, format, RELATION_FIELDS, rows, 'relations')
+
+    def _export(self, path, fmt, fields, rows, label):
+        progress = Progress(self.stderr, label)
+        with open_file(path, 'w') as file:
+            write_rows(file, fmt or guess_format(path), fields, counted(rows, progress))
+        self.stderr.write(progress.summary())
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from movie.utils import flush_pending_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute counters and rating for movies queued in PendingRating'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size=1000, **options):
+        flushed = flush_pending_ratings(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} movies'))
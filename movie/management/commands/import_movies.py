@@ -0,0 +1,133 @@
+from functools import reduce
+from operator import or_
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from movie.cache import invalidate
+from movie.models import Movie, UserMovieRelation
+from movie.transfer import FORMATS, Progress, chunked, clean_movie, clean_relation, guess_format, open_file, \
+    read_numbered_rows
+from movie.utils import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Stream movies (and optionally user relations) from CSV or JSON Lines into the database in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Movies file, "-" for stdin')
+        parser.add_argument('--relations', help='UserMovieRelation file (user is a username)')
+        parser.add_argument('--create-users', action='store_true',
+                            help='Create users missing from the database instead of skipping their relations')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension, else jsonl')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, path, relations=None, format=None, batch_size=1000, create_users=False, **options):
+        if batch_size <= 0:
+            raise CommandError('--batch-size must be positive')
+
+        progress = Progress(self.stderr, 'movies')
+        skipped = {'movie': 0, 'relation': 0}
+        with open_file(path, 'r') as file:
+            for chunk in chunked(read_numbered_rows(file, format or guess_format(path)), batch_size):
+                skipped['movie'] += self.report(self._import_movies(chunk))
+                progress.add(len(chunk))
+        self._reset_sequences()
+        self.stdout.write(progress.summary())
+
+        if relations:
+            progress = Progress(self.stderr, 'relations')
+            movie_ids = set()
+            try:
+                with open_file(relations, 'r') as file:
+                    for chunk in chunked(read_numbered_rows(file, format or guess_format(relations)), batch_size):
+                        errors = self._import_relations(chunk, create_users, movie_ids)
+                        skipped['relation'] += self.report(errors)
+                        progress.add(len(chunk))
+            finally:
+                # Relations were written with bulk queries, so the counters of their movies are recomputed
+                # once at the end, also when the import stops halfway
+                if movie_ids:
+                    rebuild_counters(movie_ids, batch_size=batch_size)
+            self.stdout.write(progress.summary())
+
+        invalidate()
+        if any(skipped.values()):
+            raise CommandError(', '.join(f'{count} {kind} rows skipped' for kind, count in skipped.items() if count))
+
+    def report(self, errors):
+        for line, error in errors:
+            self.stderr.write(f'line {line}: {error}')
+        return len(errors)
+
+    @staticmethod
+    def _import_movies(rows):
+        """Write a chunk of (line, row) movies; returns (line, error) of the rows left out"""
+        errors, movies = [], []
+        for line, row in rows:
+            try:
+                movies.append(Movie(**clean_movie(row)))
+            except (KeyError, TypeError, ValueError) as exc:
+                errors.append((line, repr(exc)))
+        Movie.objects.bulk_create(movies)
+        return errors
+
+    @staticmethod
+    def _import_relations(rows, create_users=False, written=None):
+        """
+        Write a chunk of (line, row) relations, adding the ids of their movies to `written`;
+        returns (line, error) of the rows left out
+        """
+        errors, cleaned = [], {}
+        for line, row in rows:
+            try:
+                relation = clean_relation(row)
+            except (KeyError, TypeError, ValueError) as exc:
+                errors.append((line, repr(exc)))
+                continue
+            # The last row wins, one INSERT ... ON CONFLICT can't update the same row twice
+            cleaned[relation['user'], relation['movie_id']] = line, relation
+
+        usernames = {username for username, _ in cleaned}
+        movie_ids = {movie_id for _, movie_id in cleaned}
+        with transaction.atomic():
+            if create_users:
+                User.objects.bulk_create([User(username=username) for username in usernames], ignore_conflicts=True)
+            users = User.objects.filter(username__in=usernames).in_bulk(field_name='username')
+            movies = set(Movie.objects.filter(id__in=movie_ids).values_list('id', flat=True))
+
+            objects, now = [], timezone.now()
+            for line, relation in cleaned.values():
+                if relation['user'] not in users:
+                    errors.append((line, f'unknown user {relation["user"]!r} (see --create-users)'))
+                elif relation['movie_id'] not in movies:
+                    errors.append((line, f'unknown movie {relation["movie_id"]}'))
+                else:
+                    # New likes count as liked now; liked_at of existing relations is left alone on conflict
+                    # and filled in below when the import turns them into a like
+                    liked_at = now if relation['like'] else None
+                    objects.append(UserMovieRelation(user=users[relation.pop('user')], liked_at=liked_at, **relation))
+            UserMovieRelation.objects.bulk_create(
+                objects, update_conflicts=True, unique_fields=['user', 'movie'],
+                update_fields=['like', 'in_bookmarks', 'rate'],
+            )
+            if objects:
+                pairs = reduce(or_, (Q(user=relation.user, movie_id=relation.movie_id) for relation in objects))
+                UserMovieRelation.objects.filter(pairs, like=True, liked_at__isnull=True).update(liked_at=now)
+        if written is not None:
+            written.update(relation.movie_id for relation in objects)
+        return sorted(errors)
+
+    @staticmethod
+    def _reset_sequences():
+        # Imported rows may carry explicit ids
+        statements = connection.ops.sequence_reset_sql(no_style(), [Movie])
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
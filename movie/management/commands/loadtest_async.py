@@ -0,0 +1,110 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from movie.benchmarks import seed_movies
+from movie.models import Movie
+
+
+def asgi_scope(path, query_string=''):
+    return {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query_string.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+
+
+async def asgi_request(application, scope):
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    status = None
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
+
+
+def summary(name, results, elapsed):
+    timings = sorted(timing for _, timing in results)
+    errors = sum(status != 200 for status, _ in results)
+    return (f'{name:>24}: {len(timings) / elapsed:8.1f} req/s  p50 {statistics.median(timings):7.2f} ms  '
+            f'p95 {timings[min(len(timings) - 1, int(len(timings) * 0.95))]:7.2f} ms  {errors} errors')
+
+
+class Command(BaseCommand):
+    help = ('In-process load test: concurrent requests to the async list under ASGI vs the DRF list '
+            'under WSGI with a thread per worker, as a threaded WSGI server would run it')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Movies to create for the run (committed, deleted afterwards)')
+        parser.add_argument('--query', default='page_size=20', help='Query string of every request')
+
+    def handle(self, *args, requests, concurrency, seed, query, **options):
+        seeded = set()
+        if seed:
+            before = set(Movie.objects.values_list('id', flat=True))
+            seed_movies(seed)
+            seeded = set(Movie.objects.values_list('id', flat=True)) - before
+        try:
+            # The anonymous response cache would answer the DRF list from memory: compare the views, not the cache
+            with override_settings(ALLOWED_HOSTS=['testserver'],
+                                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+                self.stdout.write(f'{requests} requests, concurrency {concurrency}, '
+                                  f'{Movie.objects.count()} movies, ?{query}')
+                self.stdout.write(self.run_wsgi(reverse('movie-list'), query, requests, concurrency))
+                self.stdout.write(asyncio.run(self.run_asgi(reverse('async-movie-list'), query, requests,
+                                                            concurrency)))
+                self.stdout.write(asyncio.run(self.run_asgi(reverse('movie-list'), query, requests, concurrency,
+                                                            name='ASGI DRF (sync) list')))
+        finally:
+            if seeded:
+                Movie.objects.filter(id__in=seeded).delete()
+
+    @staticmethod
+    def run_wsgi(path, query, requests, concurrency):
+        application = get_wsgi_application()
+        factory = RequestFactory()
+
+        def request(_):
+            environ = factory.get(f'{path}?{query}').environ
+            started = time.perf_counter()
+            response = application(environ, lambda status, headers, exc_info=None: None)
+            b''.join(response)
+            response.close()
+            return response.status_code, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(request, range(requests)))
+        return summary('WSGI DRF list', results, time.perf_counter() - started)
+
+    @staticmethod
+    async def run_asgi(path, query, requests, concurrency, name='ASGI async list'):
+        application = get_asgi_application()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                started = time.perf_counter()
+                status = await asgi_request(application, asgi_scope(path, query))
+                return status, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(request() for _ in range(requests)))
+        return summary(name, results, time.perf_counter() - started)
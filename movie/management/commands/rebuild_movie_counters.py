@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movie.utils import check_counters, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute likes/bookmarks/readers/rating counters and rating histograms on Movie from UserMovieRelation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movie', type=int, nargs='+', dest='movie_ids',
+                            help='Only rebuild these movie ids')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--check', action='store_true',
+                            help='Only compare the stored counters with a full recompute; fails on drift')
+
+    def handle(self, *args, movie_ids=None, batch_size=1000, check=False, **options):
+        if check:
+            drifted = check_counters(movie_ids, batch_size=batch_size)
+            for movie_id, fields in drifted.items():
+                self.stdout.write(f'Movie {movie_id}: ' + ', '.join(
+                    f'{field} {stored} != {expected}' for field, (stored, expected) in fields.items()))
+            if drifted:
+                raise CommandError(f'{len(drifted)} movies have drifted counters, run without --check to fix them')
+            self.stdout.write(self.style.SUCCESS('Counters are consistent'))
+            return
+
+        updated = rebuild_counters(movie_ids, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {updated} movies'))
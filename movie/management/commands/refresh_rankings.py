@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from movie.rankings import BOARDS, refresh_rankings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the top rated / most liked / trending leaderboards (run periodically, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--board', nargs='+', choices=BOARDS, dest='boards', help='Only refresh these boards')
+        parser.add_argument('--limit', type=int, help='Positions kept per board (MOVIE_LEADERBOARD_SIZE)')
+
+    def handle(self, *args, boards=None, limit=None, **options):
+        for board, written in refresh_rankings(boards, limit=limit).items():
+            self.stdout.write(self.style.SUCCESS(f'{board}: {written} positions'))
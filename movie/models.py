@@ -1,5 +1,24 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, NullIf
+from django.utils import timezone
+
+from movie.cache import invalidate
+
+RATE_CHOICES = (
+    (1, 'Ok'),
+    (2, 'Fine'),
+    (3, 'Good'),
+    (4, 'Amazing'),
+    (5, 'Incredible')
+)
+
+
+def rate_count_field(rate):
+    """Movie counter of the `rate` histogram bucket"""
+    return f'rate_{rate}_count'
 
 
 class Movie(models.Model):
@@ -14,43 +33,277 @@ class Movie(models.Model):
 
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=None, null=True)
 
+    # Denormalized counters, maintained by UserMovieRelation.save/delete
+    likes_count = models.PositiveIntegerField(default=0)
+    bookmarks_count = models.PositiveIntegerField(default=0)
+    readers_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    # Rating histogram, one counter per RATE_CHOICES bucket
+    rate_1_count = models.PositiveIntegerField(default=0)
+    rate_2_count = models.PositiveIntegerField(default=0)
+    rate_3_count = models.PositiveIntegerField(default=0)
+    rate_4_count = models.PositiveIntegerField(default=0)
+    rate_5_count = models.PositiveIntegerField(default=0)
+
+    # title + tagline tsvector, maintained by a PostgreSQL trigger (see movie.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Bumped by every change visible in the API, including counter updates; drives ETag/Last-Modified
+    updated_at = models.DateTimeField(auto_now=True)
+    # Bumped only when title or tagline change; the in-process search indexes are rebuilt on it (see movie.search).
+    # Queryset update() of title/tagline must set it too
+    text_updated_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    RATE_COUNT_FIELDS = tuple(rate_count_field(rate) for rate, _ in RATE_CHOICES)
+    COUNTER_FIELDS = ('likes_count', 'bookmarks_count', 'readers_count', 'rating_sum', 'rating_count',
+                      *RATE_COUNT_FIELDS)
+    TEXT_FIELDS = ('title', 'tagline')
+
     def __str__(self):
         return f'Id {self.id}: {self.title}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_text = {name: value for name, value in zip(field_names, values) if name in cls.TEXT_FIELDS}
+        return instance
+
+    def _text_changed(self):
+        """Whether title or tagline differ from the loaded row; fields still deferred are unchanged"""
+        loaded = getattr(self, '_loaded_text', None)
+        if loaded is None:
+            return True
+        return any(name in self.__dict__ and self.__dict__[name] != loaded.get(name) for name in self.TEXT_FIELDS)
+
+    @property
+    def rating_histogram(self):
+        """{'1': count, ..., '5': count}"""
+        return {str(rate): getattr(self, rate_count_field(rate)) for rate, _ in RATE_CHOICES}
+
+    def save(self, *args, **kwargs):
+        # A full save of an existing row must not overwrite counters updated concurrently
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            derived = (*self.COUNTER_FIELDS, 'rating', 'search_vector')
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in derived]
+        if not self._state.adding and self._text_changed():
+            self.text_updated_at = timezone.now()
+            if kwargs.get('update_fields') is not None and 'text_updated_at' not in kwargs['update_fields']:
+                kwargs['update_fields'] = [*kwargs['update_fields'], 'text_updated_at']
+        super().save(*args, **kwargs)
+        self._loaded_text = {name: self.__dict__[name] for name in self.TEXT_FIELDS if name in self.__dict__}
+        invalidate()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate()
+        return result
+
     class Meta:
         verbose_name = 'movie'
         verbose_name_plural = 'movies'
+        indexes = [
+            # `?year=` filter and keyset pages ordered by year
+            models.Index(fields=['year', 'id'], name='movie_year_id_idx'),
+        ]
 
 
 class UserMovieRelation(models.Model):
     """ like, in_bookmarks, rate """
-    RATE_CHOICES = (
-        (1, 'Ok'),
-        (2, 'Fine'),
-        (3, 'Good'),
-        (4, 'Amazing'),
-        (5, 'Incredible')
-    )
+    RATE_CHOICES = RATE_CHOICES
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Lookups by user are served by the (user, movie) unique index
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
     like = models.BooleanField(default=False)
     in_bookmarks = models.BooleanField(default=False)
     rate = models.PositiveSmallIntegerField(choices=RATE_CHOICES, null=True)
 
+    # Last change of like/in_bookmarks/rate
+    updated_at = models.DateTimeField(auto_now=True)
+    # When `like` last went from False to True (None while not liked); the trending leaderboard counts these
+    liked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Run `manage.py dedupe_movie_relations` before migrating a database that has duplicates,
+            # then `manage.py rebuild_movie_counters` once migrated
+            models.UniqueConstraint(fields=['user', 'movie'], name='movie_relation_user_movie_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['movie'], condition=Q(like=True), name='movie_relation_liked_idx'),
+            models.Index(fields=['movie'], condition=Q(in_bookmarks=True), name='movie_relation_bookmarked_idx'),
+            # A user's library pages, newest first: `WHERE user_id = ? AND like ... ORDER BY id DESC`
+            models.Index(fields=['user', '-id'], condition=Q(like=True), name='movie_relation_user_liked_idx'),
+            models.Index(fields=['user', '-id'], condition=Q(in_bookmarks=True), name='movie_relation_user_saved_idx'),
+            models.Index(fields=['user', '-id'], condition=Q(rate__isnull=False), name='movie_relation_user_rated_idx'),
+            models.Index(fields=['liked_at'], condition=Q(like=True), name='movie_relation_recent_like_idx'),
+        ]
+
     def __str__(self):
         return f' {self.user.username}: {self.movie.title},' \
                f' LIKE: {self.like}, IN_bookmarks: {self.in_bookmarks}, RATE: {self.rate}'
 
+    # The Movie counters follow save() and delete() of single relations. Queryset update()/delete(),
+    # bulk_create() and bulk_update() bypass them: call movie.utils.rebuild_counters(movie_ids)
+    # afterwards, as the bulk endpoint and import do. Deleting a User is handled by
+    # signals (see movie.utils.remember_user_movies).
     def __init__(self, *args, **kwargs):
         super(UserMovieRelation, self).__init__(*args, **kwargs)
         self.old_rate = self.rate
+        self.old_like = self.like
+        self.old_in_bookmarks = self.in_bookmarks
 
     def save(self, *args, **kwargs):
+        from movie.utils import rating_updates_deferred, defer_rating_update
+        if rating_updates_deferred():
+            self._set_liked_at(kwargs)
+            super().save(*args, **kwargs)
+            defer_rating_update(self.movie_id)
+            self.old_rate, self.old_like, self.old_in_bookmarks = self.rate, self.like, self.in_bookmarks
+            invalidate()
+            return
+
         creating = not self.pk
 
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if not creating:
+                self._lock_previous()
+
+            self._set_liked_at(kwargs)
+            super().save(*args, **kwargs)
+
+            if creating:
+                self._update_counters(readers_count=1, likes_count=int(self.like),
+                                      bookmarks_count=int(self.in_bookmarks),
+                                      rating_sum=self.rate or 0, rating_count=int(self.rate is not None),
+                                      **self._rate_deltas(self.rate, None))
+            else:
+                self._update_counters(likes_count=int(self.like) - int(self.old_like),
+                                      bookmarks_count=int(self.in_bookmarks) - int(self.old_in_bookmarks),
+                                      rating_sum=(self.rate or 0) - (self.old_rate or 0),
+                                      rating_count=int(self.rate is not None) - int(self.old_rate is not None),
+                                      **self._rate_deltas(self.rate, self.old_rate))
+
+        self.old_rate = self.rate
+        self.old_like = self.like
+        self.old_in_bookmarks = self.in_bookmarks
+        invalidate()
+
+    def delete(self, *args, **kwargs):
+        from movie.utils import rating_updates_deferred, defer_rating_update
+        if rating_updates_deferred():
+            result = super().delete(*args, **kwargs)
+            defer_rating_update(self.movie_id)
+            invalidate()
+            return result
+
+        with transaction.atomic():
+            self._lock_previous()
+            result = super().delete(*args, **kwargs)
+            if result[0]:
+                self._update_counters(readers_count=-1, likes_count=-int(self.old_like),
+                                      bookmarks_count=-int(self.old_in_bookmarks),
+                                      rating_sum=-(self.old_rate or 0),
+                                      rating_count=-int(self.old_rate is not None),
+                                      **self._rate_deltas(None, self.old_rate))
+        invalidate()
+        return result
+
+    def _set_liked_at(self, save_kwargs):
+        """Stamp `liked_at` when the relation becomes liked, clear it when the like is removed"""
+        if self.like and (self._state.adding or not self.old_like):
+            self.liked_at = timezone.now()
+        elif not self.like:
+            self.liked_at = None
+        update_fields = save_kwargs.get('update_fields')
+        if update_fields is not None and 'like' in update_fields:
+            save_kwargs['update_fields'] = {*update_fields, 'liked_at'}
+
+    def _lock_previous(self):
+        """
+        Lock the row and take the stored values as the base of the deltas,
+        so two concurrent requests for the same relation can't both apply theirs
+        """
+        previous = UserMovieRelation.objects.select_for_update().filter(pk=self.pk).values(
+            'like', 'in_bookmarks', 'rate').first()
+        if previous is not None:
+            self.old_like = previous['like']
+            self.old_in_bookmarks = previous['in_bookmarks']
+            self.old_rate = previous['rate']
+
+    @staticmethod
+    def _rate_deltas(rate, old_rate):
+        """Histogram bucket changes of a rate going from `old_rate` to `rate` (either may be None)"""
+        deltas = {}
+        if old_rate != rate:
+            if old_rate is not None:
+                deltas[rate_count_field(old_rate)] = -1
+            if rate is not None:
+                deltas[rate_count_field(rate)] = 1
+        return deltas
+
+    def _update_counters(self, **deltas):
+        """
+        Single `UPDATE movie SET x = x + delta` for the non-zero deltas.
+        The average is derived from the new sum and count inside the same statement,
+        so concurrent raters never overwrite each other's result.
+        """
+        changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if 'rating_sum' in changes or 'rating_count' in changes:
+            rating_sum = F('rating_sum') + deltas.get('rating_sum', 0)
+            rating_count = F('rating_count') + deltas.get('rating_count', 0)
+            changes['rating'] = Cast(rating_sum, FloatField()) / NullIf(rating_count, 0)
+        if changes:
+            Movie.objects.filter(pk=self.movie_id).update(updated_at=timezone.now(), **changes)
+
+
+class PendingRating(models.Model):
+    """Movies whose counters and rating wait for `flush_pending_ratings` (MOVIE_RATING_UPDATES = 'queue')"""
+    movie = models.OneToOneField(Movie, on_delete=models.CASCADE, primary_key=True)
+
+    def __str__(self):
+        return f'Pending: {self.movie_id}'
+
 
-        if self.old_rate != self.rate or creating:
-            from movie.utils import set_rating
-            set_rating(self.movie)
+class MovieRanking(models.Model):
+    """A leaderboard position, precomputed by `manage.py refresh_rankings` (see movie.rankings)"""
+    BOARD_CHOICES = (
+        ('top_rated', 'Top rated'),
+        ('most_liked', 'Most liked'),
+        ('trending', 'Trending'),
+    )
+
+    board = models.CharField(max_length=20, choices=BOARD_CHOICES)
+    position = models.PositiveIntegerField()
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='rankings')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            # Also the index of the pages: `WHERE board = ? AND position > ? ORDER BY position LIMIT n`
+            models.UniqueConstraint(fields=['board', 'position'], name='movie_ranking_board_position_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.board} #{self.position}: {self.movie_id}'
+
+
+class MovieSimilarity(models.Model):
+    """One of a movie's top-K neighbours by item-item cosine similarity, built by `manage.py build_similar_movies`"""
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='similarities')
+    rank = models.PositiveSmallIntegerField()
+    similar = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    # Start of the build that wrote the row; relations changed after it are picked up by `--changed`
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # Also the index of `/movie/<id>/similar/`: `WHERE movie_id = ? ORDER BY rank`
+            models.UniqueConstraint(fields=['movie', 'rank'], name='movie_similarity_movie_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.movie_id} #{self.rank}: {self.similar_id}'
@@ -0,0 +1,187 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict, namedtuple
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import BigIntegerField, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+Cursor = namedtuple('Cursor', ['values', 'reverse'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination: `WHERE (year, id) > (2021, 17) ... LIMIT n` instead of OFFSET.
+    The view ordering is extended with a unique tie-breaker so the order is total.
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    tie_breaker = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._set_page(list(self._page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, the page is read with the async ORM"""
+        return self._set_page([obj async for obj in self._page_queryset(queryset, request)])
+
+    def _page_queryset(self, queryset, request):
+        """One row past the page, so whether there is more is known without a COUNT"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is not None:
+            self.cursor = self.cursor._replace(values=self.clean_cursor_values(queryset, self.cursor.values))
+
+        reverse = bool(self.cursor and self.cursor.reverse)
+        ordering = self.ordering
+        if self.cursor is not None:
+            queryset = queryset.filter(self.get_seek_filter(self.cursor.values, reverse))
+        if reverse:
+            ordering = [self._invert(field) for field in ordering]
+        return queryset.order_by(*ordering)[:self.page_size + 1]
+
+    def _set_page(self, results):
+        reverse = bool(self.cursor and self.cursor.reverse)
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)]
+        if not any(field.lstrip('-') == self.tie_breaker for field in ordering):
+            ordering.append(self.tie_breaker)
+        return ordering
+
+    def get_seek_filter(self, values, reverse=False):
+        """(a, b, c) > (x, y, z)  ==  a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)"""
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        branches = []
+        for index, field in enumerate(self.ordering):
+            descending = field.startswith('-') != reverse
+            name = field.lstrip('-')
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            equal = {other.lstrip('-'): value for other, value in zip(self.ordering[:index], values)}
+            branches.append(Q(**equal, **{lookup: values[index]}))
+        return reduce(or_, branches)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(self._position(self.page[-1]), reverse=False))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(self._position(self.page[0]), reverse=True))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            return Cursor(list(payload['v']), bool(payload.get('r')))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def clean_cursor_values(self, queryset, values):
+        """Cursor values converted by their ordering fields, so a forged cursor is a 404 rather than a bad query"""
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        cleaned = []
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            if name in queryset.query.annotations:
+                model_field = queryset.query.annotations[name].output_field
+            else:
+                model_field = queryset.model._meta.get_field(name)
+            try:
+                value = model_field.to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None or not self._in_range(queryset, model_field, value):
+                raise NotFound(self.invalid_cursor_message)
+            cleaned.append(value)
+        return cleaned
+
+    @staticmethod
+    def _in_range(queryset, model_field, value):
+        # Integers the database can't bind fail the query instead of matching nothing;
+        # SQLite reports no column ranges but still stops at 64 bits
+        operations = connections[queryset.db].ops
+        internal_type = model_field.get_internal_type()
+        if internal_type not in operations.integer_field_ranges:
+            return True
+        low, high = operations.integer_field_range(internal_type)
+        low = -BigIntegerField.MAX_BIGINT - 1 if low is None else low
+        high = BigIntegerField.MAX_BIGINT if high is None else high
+        return low <= value <= high
+
+    def encode_cursor(self, cursor):
+        payload = {'v': cursor.values}
+        if cursor.reverse:
+            payload['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(payload, cls=DjangoJSONEncoder).encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def _position(self, obj):
+        if isinstance(obj, dict):
+            return [obj[field.lstrip('-')] for field in self.ordering]
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+
+class RankingPagination(KeysetPagination):
+    """Leaderboard pages: a board's positions are unique, so they are the whole cursor"""
+    tie_breaker = 'position'
@@ -0,0 +1,107 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('movie.perf')
+
+_metrics = ContextVar('movie_perf_metrics', default=None)
+
+
+class RequestMetrics:
+    """What one sampled request spent: DB queries and time, plus named sections such as `serialize`"""
+    __slots__ = ('started', 'queries', 'db_time', 'timings', '_depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = {}
+        self._depth = {}
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+def current_metrics():
+    return _metrics.get()
+
+
+@contextmanager
+def timed(name):
+    """
+    Adds the block's duration to the current request's `name` timing; free outside a sampled request.
+    Nested blocks of the same name (a serializer inside a serializer) are only counted once.
+    """
+    metrics = _metrics.get()
+    if metrics is None or metrics._depth.get(name):
+        yield
+        return
+    metrics._depth[name] = 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics._depth[name] = 0
+        metrics.timings[name] = metrics.timings.get(name, 0.0) + time.perf_counter() - started
+
+
+class PerformanceMiddleware:
+    """
+    Per-request timing, DB query count/time (connection.execute_wrapper), `timed()` sections
+    and response size, logged as one JSON line on `movie.perf` and sent as `Server-Timing`.
+    PERF_SAMPLE_RATE is the fraction of requests measured; at 0 the middleware unloads itself.
+    """
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, 'PERF_SAMPLE_RATE', 0.0)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(metrics.record_query))
+                response = self.get_response(request)
+        finally:
+            _metrics.reset(token)
+
+        total = time.perf_counter() - metrics.started
+        size = None if response.streaming else len(response.content)
+        response['Server-Timing'] = self.server_timing(metrics, total)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            **{f'{name}_ms': round(duration * 1000, 2) for name, duration in metrics.timings.items()},
+            'size': size,
+        }))
+        return response
+
+    @staticmethod
+    def server_timing(metrics, total):
+        entries = [f'total;dur={total * 1000:.2f}',
+                   f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries"']
+        entries.extend(f'{name};dur={duration * 1000:.2f}' for name, duration in metrics.timings.items())
+        return ', '.join(entries)
@@ -0,0 +1,106 @@
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('movie.queries')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """
+    SQL template the query was built from: literals and placeholders become `?`
+    and an IN list of any length becomes `(?)`, so `WHERE id = 1` and `WHERE id = 2` group together
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql.replace('%s', '?'))
+    sql = _IN_LIST_RE.sub('(?)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+class QueryIssues(AssertionError):
+    pass
+
+
+class QueryDetector:
+    """
+    Groups the SQL executed inside the block by template and flags templates run more than
+    `repeat_threshold` times (N+1 patterns) and single queries slower than `slow_ms`.
+    In tests, use it as an assertion:
+
+        with QueryDetector():
+            self.client.get(url)
+
+    raises QueryIssues on exit; with `raise_on_issue=False` the findings are only kept in `.issues`.
+    """
+
+    def __init__(self, repeat_threshold=None, slow_ms=None, raise_on_issue=True, using=None):
+        self.repeat_threshold = repeat_threshold or getattr(settings, 'QUERY_DETECTOR_REPEAT_THRESHOLD', 5)
+        self.slow_ms = slow_ms or getattr(settings, 'QUERY_DETECTOR_SLOW_MS', 100)
+        self.raise_on_issue = raise_on_issue
+        self.aliases = [using] if using else list(connections)
+        self.templates = defaultdict(list)
+        self.issues = []
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in self.aliases:
+            self._stack.enter_context(connections[alias].execute_wrapper(self.record_query))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stack.close()
+        self.issues = self.find_issues()
+        if exc_type is None and self.issues and self.raise_on_issue:
+            raise QueryIssues('\n'.join(self.describe(issue) for issue in self.issues))
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.templates[normalize(sql)].append((time.perf_counter() - started) * 1000)
+
+    def find_issues(self):
+        issues = []
+        for template, durations in self.templates.items():
+            if len(durations) > self.repeat_threshold:
+                issues.append({'type': 'repeated', 'sql': template, 'count': len(durations),
+                               'total_ms': round(sum(durations), 2)})
+            slow = [duration for duration in durations if duration > self.slow_ms]
+            if slow:
+                issues.append({'type': 'slow', 'sql': template, 'count': len(slow),
+                               'max_ms': round(max(slow), 2)})
+        return issues
+
+    @staticmethod
+    def describe(issue):
+        if issue['type'] == 'repeated':
+            return f'{issue["count"]} x ({issue["total_ms"]} ms): {issue["sql"]}'
+        return f'{issue["count"]} over budget (max {issue["max_ms"]} ms): {issue["sql"]}'
+
+
+class QueryDetectorMiddleware:
+    """Log-only QueryDetector around every request (warning on `movie.queries`); on with QUERY_DETECTOR"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_DETECTOR', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryDetector(raise_on_issue=False) as detector:
+            response = self.get_response(request)
+        for issue in detector.issues:
+            logger.warning(json.dumps({'method': request.method, 'path': request.path, **issue}))
+        return response
@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, FloatField, Sum, Value
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from movie.models import Movie, MovieRanking, UserMovieRelation
+
+BOARDS = [board for board, _ in MovieRanking.BOARD_CHOICES]
+
+
+def top_rated(limit, min_votes=None):
+    """
+    Bayesian average: (rating_sum + m * C) / (rating_count + m), where C is the catalogue mean
+    and m the minimum votes, so a single 5 doesn't outrank hundreds of 4s. Reads the Movie counters only.
+    """
+    if min_votes is None:
+        min_votes = getattr(settings, 'MOVIE_LEADERBOARD_MIN_VOTES', 10)
+    totals = Movie.objects.aggregate(rating_sum=Sum('rating_sum'), rating_count=Sum('rating_count'))
+    if not totals['rating_count']:
+        return []
+    mean = totals['rating_sum'] / totals['rating_count']
+    score = ((Cast('rating_sum', FloatField()) + Value(min_votes * mean))
+             / (Cast('rating_count', FloatField()) + Value(float(min_votes))))
+    return list(Movie.objects.filter(rating_count__gt=0).annotate(score=score)
+                .order_by('-score', 'id').values_list('id', 'score')[:limit])
+
+
+def most_liked(limit):
+    return list(Movie.objects.filter(likes_count__gt=0).order_by('-likes_count', 'id')
+                .values_list('id', 'likes_count')[:limit])
+
+
+def trending(limit, days=None):
+    """
+    Likes given within the last `days` (by `liked_at`, so re-rating or bookmarking an old like doesn't count),
+    read from the recent-likes partial index
+    """
+    if days is None:
+        days = getattr(settings, 'MOVIE_TRENDING_DAYS', 7)
+    since = timezone.now() - timedelta(days=days)
+    return list(UserMovieRelation.objects.filter(like=True, liked_at__gte=since).values('movie_id')
+                .annotate(score=Count('id')).order_by('-score', 'movie_id').values_list('movie_id', 'score')[:limit])
+
+
+SCORES = {
+    'top_rated': top_rated,
+    'most_liked': most_liked,
+    'trending': trending,
+}
+
+
+def refresh_rankings(boards=None, limit=None, batch_size=1000):
+    """
+    Recompute the given boards (all by default) and replace their rows in one transaction each,
+    so readers see either the old or the new board. Returns {board: positions written}.
+    """
+    if limit is None:
+        limit = getattr(settings, 'MOVIE_LEADERBOARD_SIZE', 1000)
+    written = {}
+    for board in boards or BOARDS:
+        scores = SCORES[board](limit)
+        with transaction.atomic():
+            MovieRanking.objects.filter(board=board).delete()
+            MovieRanking.objects.bulk_create([
+                MovieRanking(board=board, position=position, movie_id=movie_id, score=score)
+                for position, (movie_id, score) in enumerate(scores, start=1)
+            ], batch_size=batch_size)
+        written[board] = len(scores)
+    return written
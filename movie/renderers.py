@@ -0,0 +1,61 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from movie.perf import timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Anything orjson doesn't serialize natively (Decimal, lazy strings, querysets, ...) goes through DRF's encoder
+_fallback = JSONEncoder()
+ORJSON_OPTIONS = orjson and orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(data):
+    """`data` as compact UTF-8 JSON bytes, the same text JSONRenderer produces"""
+    ret = orjson.dumps(data, default=_fallback.default, option=ORJSON_OPTIONS)
+    # Same escaping as JSONRenderer: both are valid JSON but not valid JavaScript
+    if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+        ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return ret
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer on orjson when it's installed. Indented output (`; indent=` in Accept, or the
+    browsable API), non-compact settings and values orjson rejects (e.g. ints over 64 bits) take
+    the stdlib path.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (orjson is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return dumps(data)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser on orjson when it's installed and the body is UTF-8"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8').lower().replace('_', '-')
+        if orjson is None or encoding not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,236 @@
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Case, Count, F, FloatField, Max, Q, Value, When
+
+SEARCH_CONFIG = 'english'
+TOKEN_RE = re.compile(r'\w+')
+
+# PostgreSQL keeps Movie.search_vector in sync with a trigger, so bulk_create/update paths are covered too
+POSTGRES_SEARCH_DDL = (
+    "CREATE INDEX IF NOT EXISTS movie_movie_search_vector_gin ON movie_movie USING gin (search_vector)",
+    "DROP TRIGGER IF EXISTS movie_movie_search_vector_update ON movie_movie",
+    f"CREATE TRIGGER movie_movie_search_vector_update BEFORE INSERT OR UPDATE OF title, tagline "
+    f"ON movie_movie FOR EACH ROW EXECUTE FUNCTION "
+    f"tsvector_update_trigger(search_vector, 'pg_catalog.{SEARCH_CONFIG}', title, tagline)",
+    "UPDATE movie_movie SET search_vector = to_tsvector('pg_catalog.{0}', coalesce(title, '') || ' ' || "
+    "coalesce(tagline, '')) WHERE search_vector IS NULL".format(SEARCH_CONFIG),
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS movie_movie_title_trgm ON movie_movie USING gin (title gin_trgm_ops)",
+)
+
+# In-process search: most matched ids passed to a query (SQLite allows 999 variables before 3.32)
+MAX_SEARCH_IDS = 500
+
+# pg_trgm's default `%` threshold
+TRIGRAM_THRESHOLD = 0.3
+
+
+def install_search_ddl(using='default', **kwargs):
+    """post_migrate hook: indexes and triggers Django's schema editor can't express"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for statement in POSTGRES_SEARCH_DDL:
+            cursor.execute(statement)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def trigrams(text):
+    """Trigrams the way pg_trgm extracts them: per lowercased word, padded with two spaces before and one after"""
+    grams = set()
+    for word in tokenize(text):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class InvertedIndex:
+    """
+    In-process full-text index over Movie title/tagline, used where PostgreSQL
+    text search isn't available. Postings are `token -> {movie_id: weight}`;
+    title tokens weigh twice as much as tagline tokens.
+    """
+    fields = ('id', 'title', 'tagline')
+    title_weight = 2.0
+    tagline_weight = 1.0
+
+    def __init__(self, rows=()):
+        self.postings = defaultdict(dict)
+        self.size = 0
+        for movie_id, title, tagline in rows:
+            self.add(movie_id, title, tagline)
+
+    def add(self, movie_id, title, tagline):
+        self.size += 1
+        for weight, text in ((self.title_weight, title), (self.tagline_weight, tagline)):
+            for token in tokenize(text):
+                postings = self.postings[token]
+                postings[movie_id] = postings.get(movie_id, 0.0) + weight
+
+    def search(self, terms):
+        """{movie_id: rank} of the movies containing every term, ranked by tf-idf"""
+        tokens = [token for term in terms for token in tokenize(term)]
+        if not tokens:
+            return {}
+        postings = [self.postings.get(token, {}) for token in tokens]
+        postings.sort(key=len)
+        matches = set(postings[0])
+        for other in postings[1:]:
+            matches.intersection_update(other)
+        if not matches:
+            return {}
+        ranks = dict.fromkeys(matches, 0.0)
+        for posting in postings:
+            idf = math.log(1 + self.size / len(posting))
+            for movie_id in matches:
+                ranks[movie_id] += posting[movie_id] * idf
+        return ranks
+
+
+class TrigramIndex:
+    """
+    In-process stand-in for a pg_trgm GIN index on Movie.title: postings are
+    `trigram -> [movie_id]`, similarity is |A & B| / |A | B| as in `similarity()`.
+    """
+    fields = ('id', 'title')
+    max_candidates = 1000
+
+    def __init__(self, rows=()):
+        self.postings = defaultdict(list)
+        self.sizes = {}
+        for movie_id, title in rows:
+            grams = trigrams(title)
+            self.sizes[movie_id] = len(grams)
+            for gram in grams:
+                self.postings[gram].append(movie_id)
+
+    def search(self, text, limit=10, threshold=TRIGRAM_THRESHOLD, budget=None):
+        """
+        [(movie_id, similarity)] best first. Postings are merged rarest trigram first and only the
+        `max_candidates` sharing the most trigrams are scored. With a `budget` in seconds, merging and
+        scoring stop when it runs out and the best candidates seen so far are returned.
+        """
+        grams = trigrams(text)
+        if not grams:
+            return []
+        deadline = budget and time.perf_counter() + budget
+
+        shared = Counter()
+        for gram in sorted(grams, key=lambda gram: len(self.postings.get(gram, ()))):
+            shared.update(self.postings.get(gram, ()))
+            if deadline and time.perf_counter() > deadline:
+                break
+
+        results = []
+        # Most shared trigrams first, so the candidates scored before a deadline are the likeliest ones
+        candidates = heapq.nlargest(self.max_candidates, shared.items(), key=itemgetter(1))
+        for movie_id, common in candidates:
+            similarity = common / (len(grams) + self.sizes[movie_id] - common)
+            if similarity >= threshold:
+                results.append((movie_id, similarity))
+            if deadline and time.perf_counter() > deadline:
+                break
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results[:limit]
+
+
+_index_lock = threading.Lock()
+_indexes = {}
+
+
+def get_index(queryset, index_class=InvertedIndex):
+    """
+    The process-wide `index_class` instance, rebuilt when the movie table signature (count, max text_updated_at)
+    changes, so counter updates don't rebuild it. The signature check is one aggregate query; the rebuild
+    streams `index_class.fields`.
+    """
+    model = queryset.model
+    signature = model.objects.using(queryset.db).aggregate(count=Count('id'), updated=Max('text_updated_at'))
+    signature = (queryset.db, signature['count'], signature['updated'])
+    with _index_lock:
+        cached = _indexes.get(index_class)
+        if cached is None or cached[0] != signature:
+            rows = model.objects.using(queryset.db).values_list(*index_class.fields).iterator(chunk_size=2000)
+            cached = _indexes[index_class] = (signature, index_class(rows))
+        return cached[1]
+
+
+def full_text_search(queryset, terms, rank=True):
+    """
+    Filter `queryset` to movies matching all terms and annotate `search_rank` unless `rank` is false.
+    Outside PostgreSQL the matches come from the in-process index and are passed to the query as ids
+    (with a CASE over them for the rank), at most MAX_SEARCH_IDS of them: above that, an unranked search
+    filters with one word-boundary regex per term instead and a ranked one keeps the best-ranked matches.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        query = SearchQuery(' '.join(terms), config=SEARCH_CONFIG, search_type='websearch')
+        queryset = queryset.filter(search_vector=query)
+        return queryset.annotate(search_rank=SearchRank(F('search_vector'), query)) if rank else queryset
+
+    ranks = get_index(queryset, InvertedIndex).search(terms)
+    if not ranks:
+        queryset = queryset.none()
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())) if rank else queryset
+    if not rank:
+        if len(ranks) <= MAX_SEARCH_IDS:
+            return queryset.filter(id__in=list(ranks))
+        # Same matches as the index: every token as a whole word of the title or the tagline
+        for token in {token for term in terms for token in tokenize(term)}:
+            pattern = rf'\b{re.escape(token)}\b'
+            queryset = queryset.filter(Q(title__iregex=pattern) | Q(tagline__iregex=pattern))
+        return queryset
+
+    if len(ranks) > MAX_SEARCH_IDS:
+        ranks = dict(heapq.nlargest(MAX_SEARCH_IDS, ranks.items(), key=itemgetter(1)))
+    return queryset.filter(id__in=list(ranks)).annotate(search_rank=Case(
+        *(When(id=movie_id, then=Value(rank)) for movie_id, rank in ranks.items()),
+        default=Value(0.0), output_field=FloatField(),
+    ))
+
+
+def is_statement_timeout(exc):
+    """Whether a database error is PostgreSQL cancelling the statement (`query_canceled`, SQLSTATE 57014)"""
+    cause = exc.__cause__
+    return (getattr(cause, 'pgcode', None) or getattr(cause, 'sqlstate', None)) == '57014'
+
+
+def fuzzy_search(queryset, text, limit=10, budget=0.2):
+    """
+    Movies whose title is trigram-similar to `text`, best first, each with a `similarity` attribute.
+    `budget` (seconds) bounds the query: PostgreSQL gets it as statement_timeout, the in-process
+    index stops scoring when it runs out. A query cancelled by the timeout returns no results,
+    other database errors propagate.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        try:
+            with transaction.atomic(using=queryset.db):
+                with connections[queryset.db].cursor() as cursor:
+                    cursor.execute('SET LOCAL statement_timeout = %s', [int(budget * 1000)])
+                return list(queryset.filter(title__trigram_similar=text)
+                            .annotate(similarity=TrigramSimilarity('title', text))
+                            .order_by('-similarity', 'id')[:limit])
+        except DatabaseError as exc:
+            if not is_statement_timeout(exc):
+                raise
+            return []
+
+    scores = get_index(queryset, TrigramIndex).search(text, limit=limit, budget=budget)
+    movies = queryset.in_bulk([movie_id for movie_id, _ in scores])
+    results = []
+    for movie_id, similarity in scores:
+        if movie_id in movies:
+            movies[movie_id].similarity = similarity
+            results.append(movies[movie_id])
+    return results
@@ -1,8 +1,27 @@
+from collections import defaultdict
+
 from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 
-from movie.models import Movie, UserMovieRelation
+from movie.models import Movie, MovieRanking, MovieSimilarity, UserMovieRelation
+from movie.perf import timed
+
+
+class TimedDataMixin:
+    """Counts building `.data` into the request's `serialize` timing (see movie.perf)"""
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
 
 
 class MovieReaderSerializer(ModelSerializer):
@@ -11,19 +30,212 @@ class MovieReaderSerializer(ModelSerializer):
         fields = ('username', 'email')
 
 
-class MoviesSerializer(ModelSerializer):
-    annotated_likes = serializers.IntegerField(read_only=True)
+class MoviesSerializer(TimedDataMixin, ModelSerializer):
+    annotated_likes = serializers.IntegerField(source='likes_count', read_only=True)
     rating = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
 
-    readers = MovieReaderSerializer(many=True, read_only=True)
+    readers = serializers.SerializerMethodField()
+    readers_count = serializers.IntegerField(read_only=True)
+
+    # The requesting user's relation, annotated by `annotate_user_flags`; left out when not annotated
+    is_liked = serializers.BooleanField(read_only=True)
+    is_bookmarked = serializers.BooleanField(read_only=True)
+    my_rate = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Movie
-        fields = ('id', 'title', 'tagline', 'description', 'year', 'readers',
-                  'annotated_likes', 'rating')
+        fields = ('id', 'title', 'tagline', 'description', 'year', 'readers', 'readers_count',
+                  'annotated_likes', 'rating', 'is_liked', 'is_bookmarked', 'my_rate')
+        list_serializer_class = TimedListSerializer
+
+    def get_readers(self, obj):
+        """Bounded list prefetched by `MovieViewSet`, or every reader when used on its own"""
+        readers = getattr(obj, 'limited_readers', None)
+        if readers is None:
+            readers = obj.readers.all()
+        return MovieReaderSerializer(readers, many=True).data
+
+
+class MovieDetailSerializer(MoviesSerializer):
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+
+    class Meta(MoviesSerializer.Meta):
+        fields = (*MoviesSerializer.Meta.fields, 'rating_histogram')
+
+
+def readers_queryset(movie_ids, limit=None):
+    """(movie_id, *MovieReaderSerializer fields) rows ordered by user id, at most `limit` per movie (ROW_NUMBER)"""
+    relations = UserMovieRelation.objects.filter(movie_id__in=movie_ids)
+    if limit is not None:
+        relations = relations.annotate(
+            position=Window(RowNumber(), partition_by=F('movie_id'), order_by=F('user_id').asc()),
+        ).filter(position__lte=limit)
+    return relations.order_by('movie_id', 'user_id').values_list(
+        'movie_id', *(f'user__{name}' for name in MovieReaderSerializer.Meta.fields))
+
+
+def fetch_readers(movie_ids, limit=None):
+    """{movie_id: [reader, ...]} in MovieReaderSerializer's shape, in one query"""
+    return group_readers(readers_queryset(movie_ids, limit))
 
 
-class UserMovieRelationSerializer(ModelSerializer):
+async def afetch_readers(movie_ids, limit=None):
+    return group_readers([row async for row in readers_queryset(movie_ids, limit)])
+
+
+def group_readers(rows):
+    names = MovieReaderSerializer.Meta.fields
+    readers = defaultdict(list)
+    for movie_id, *values in rows:
+        readers[movie_id].append(dict(zip(names, values)))
+    return readers
+
+
+class MovieRowSerializer:
+    """
+    Read-only equivalent of MoviesSerializer over `.values()` rows, used for list responses.
+    Conversions are resolved once from MoviesSerializer's own fields, so the output is the
+    same while per-object field binding, attribute lookups and model instances are skipped.
+    """
+    serializer_class = MoviesSerializer
+    native_types = {
+        serializers.CharField: str,
+        serializers.IntegerField: int,
+        serializers.BooleanField: bool,
+        serializers.FloatField: float,
+    }
+    _compiled = None
+
+    def __init__(self, instance=None, many=True, readers_limit=None, context=None):
+        self.instance = instance
+        self.readers_limit = readers_limit
+
+    @classmethod
+    def compiled(cls):
+        """[(name, source, field, native type or None)]; `readers` has no source"""
+        if cls._compiled is None:
+            compiled = []
+            for name, field in cls.serializer_class().fields.items():
+                if name == 'readers':
+                    compiled.append((name, None, None, None))
+                    continue
+                if field.source == '*' or '.' in field.source:
+                    raise ImproperlyConfigured(f'{cls.__name__} cannot read {name!r} from a values() row')
+                native = next((native for field_class, native in cls.native_types.items()
+                               if type(field) is field_class), None)
+                compiled.append((name, field.source, field, native))
+            cls._compiled = compiled
+        return cls._compiled
+
+    @classmethod
+    def rows(cls, queryset, extra=()):
+        """
+        `queryset` as dict rows with every column the representation, validators and keyset cursors need,
+        plus the `extra` ones
+        """
+        # Sources that are neither columns nor annotations of this queryset are left out, like DRF skips them
+        available = {field.attname for field in queryset.model._meta.concrete_fields} | set(queryset.query.annotations)
+        columns = {'id', 'updated_at', *extra} | {source for _, source, _, _ in cls.compiled() if source in available}
+        columns |= {name.lstrip('-') for name in queryset.query.order_by if isinstance(name, str)}
+        return queryset.prefetch_related(None).values(*sorted(columns))
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            rows = list(self.instance)
+            readers = {}
+            if self.readers_limit != 0 and rows:
+                readers = fetch_readers([row['id'] for row in rows], self.readers_limit)
+            return [self.to_representation(row, readers.get(row['id'], [])) for row in rows]
+
+    async def adata(self):
+        """`.data` for async views: `instance` is a list of rows, readers are read with the async ORM"""
+        readers = {}
+        if self.readers_limit != 0 and self.instance:
+            readers = await afetch_readers([row['id'] for row in self.instance], self.readers_limit)
+        return [self.to_representation(row, readers.get(row['id'], [])) for row in self.instance]
+
+    def to_representation(self, row, readers=()):
+        data = {}
+        for name, source, field, native in self.compiled():
+            if source is None:
+                data[name] = list(readers)
+                continue
+            if source not in row:
+                continue
+            value = row[source]
+            if value is not None and type(value) is not native:
+                value = field.to_representation(value)
+            data[name] = value
+        return data
+
+
+class FuzzyMovieSerializer(TimedDataMixin, ModelSerializer):
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Movie
+        fields = ('id', 'title', 'tagline', 'year', 'similarity')
+        list_serializer_class = TimedListSerializer
+
+
+class UserMovieRelationSerializer(TimedDataMixin, ModelSerializer):
     class Meta:
         model = UserMovieRelation
         fields = ('movie', 'like', 'in_bookmarks', 'rate')
+
+
+class MovieSummarySerializer(ModelSerializer):
+    rating = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Movie
+        fields = ('id', 'title', 'tagline', 'year', 'rating')
+
+
+class MovieStatsSerializer(TimedDataMixin, ModelSerializer):
+    """Counters and rating histogram of a movie, read from its row without touching UserMovieRelation"""
+    rating = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+
+    class Meta:
+        model = Movie
+        fields = ('id', 'rating', 'rating_count', 'rating_histogram', 'likes_count', 'bookmarks_count',
+                  'readers_count')
+        list_serializer_class = TimedListSerializer
+
+
+class LibraryEntrySerializer(TimedDataMixin, ModelSerializer):
+    """A relation of the requesting user with its movie, for the likes/bookmarks/ratings lists"""
+    movie = MovieSummarySerializer(read_only=True)
+
+    class Meta:
+        model = UserMovieRelation
+        fields = ('id', 'movie', 'like', 'in_bookmarks', 'rate')
+        list_serializer_class = TimedListSerializer
+
+
+class MovieRankingSerializer(TimedDataMixin, ModelSerializer):
+    movie = MovieSummarySerializer(read_only=True)
+
+    class Meta:
+        model = MovieRanking
+        fields = ('position', 'score', 'movie')
+        list_serializer_class = TimedListSerializer
+
+
+class SimilarMovieSerializer(TimedDataMixin, ModelSerializer):
+    movie = MovieSummarySerializer(source='similar', read_only=True)
+
+    class Meta:
+        model = MovieSimilarity
+        fields = ('rank', 'score', 'movie')
+        list_serializer_class = TimedListSerializer
+
+
+class BulkRelationItemSerializer(serializers.Serializer):
+    """One item of `POST /movie_relation/bulk/`; omitted flags keep their current value"""
+    movie = serializers.IntegerField()
+    like = serializers.BooleanField(required=False)
+    in_bookmarks = serializers.BooleanField(required=False)
+    rate = serializers.ChoiceField(choices=UserMovieRelation.RATE_CHOICES, allow_null=True, required=False)
@@ -0,0 +1,110 @@
+"""
+Item-based "similar movies": cosine similarity between the movie columns of the user x movie
+interaction matrix, computed in blocks with NumPy/SciPy and stored as top-K rows in MovieSimilarity.
+"""
+
+from array import array
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from movie.models import MovieSimilarity, UserMovieRelation
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+
+def interaction(like, in_bookmarks, rate):
+    """How much a relation says about a user's interest in a movie: having it at all, then like, bookmark and rate"""
+    return 1.0 + like + 0.5 * in_bookmarks + (rate or 0) / 5
+
+
+def interaction_matrix(chunk_size=10000):
+    """(movie ids, users x movies CSC matrix with L2-normalized columns) from every relation, streamed"""
+    users, movies, weights = array('q'), array('q'), array('d')
+    for user_id, movie_id, like, in_bookmarks, rate in UserMovieRelation.objects.values_list(
+            'user_id', 'movie_id', 'like', 'in_bookmarks', 'rate').iterator(chunk_size=chunk_size):
+        users.append(user_id)
+        movies.append(movie_id)
+        weights.append(interaction(like, in_bookmarks, rate))
+    if not users:
+        return np.array([], dtype=np.int64), sparse.csc_matrix((0, 0))
+
+    user_ids, user_index = np.unique(np.frombuffer(users, dtype=np.int64), return_inverse=True)
+    movie_ids, movie_index = np.unique(np.frombuffer(movies, dtype=np.int64), return_inverse=True)
+    matrix = sparse.csc_matrix((np.frombuffer(weights, dtype=np.float64), (user_index, movie_index)),
+                               shape=(len(user_ids), len(movie_ids)))
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    return movie_ids, (matrix @ sparse.diags(1.0 / norms)).tocsc()
+
+
+def top_neighbours(similarities, columns, k):
+    """For each row of a (block x movies) CSR similarity block: [(column, score)] best first, without itself"""
+    for row, column in enumerate(columns):
+        start, end = similarities.indptr[row], similarities.indptr[row + 1]
+        indices, scores = similarities.indices[start:end], similarities.data[start:end]
+        keep = (indices != column) & (scores > 0)
+        indices, scores = indices[keep], scores[keep]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k)[:k]
+            indices, scores = indices[best], scores[best]
+        order = np.lexsort((indices, -scores))
+        yield column, list(zip(indices[order].tolist(), scores[order].tolist()))
+
+
+def build_similarities(movie_ids=None, k=20, block_size=256):
+    """
+    Recompute the top-`k` neighbours of `movie_ids` (every movie with relations by default).
+    Similarities of a block of movies are one sparse product against the whole matrix;
+    each block's rows are replaced in its own transaction. Returns the number of movies written.
+    """
+    if np is None:
+        raise ImproperlyConfigured('NumPy and SciPy are required to build movie similarities')
+
+    started = timezone.now()
+    all_ids, matrix = interaction_matrix()
+    columns = np.arange(len(all_ids))
+    if movie_ids is not None:
+        columns = columns[np.isin(all_ids, list(movie_ids))]
+    transposed = matrix.T.tocsr()
+
+    written = 0
+    for offset in range(0, len(columns), block_size):
+        block = columns[offset:offset + block_size]
+        similarities = (transposed[block] @ matrix).tocsr()
+        rows = []
+        for column, neighbours in top_neighbours(similarities, block, k):
+            rows.extend(MovieSimilarity(movie_id=int(all_ids[column]), rank=rank, similar_id=int(all_ids[other]),
+                                        score=score, computed_at=started)
+                        for rank, (other, score) in enumerate(neighbours, start=1))
+        with transaction.atomic():
+            MovieSimilarity.objects.filter(movie_id__in=all_ids[block].tolist()).delete()
+            MovieSimilarity.objects.bulk_create(rows, batch_size=2000)
+        written += len(block)
+
+    if movie_ids is None:
+        # Movies that lost all their relations since the previous build
+        MovieSimilarity.objects.filter(computed_at__lt=started).delete()
+    elif movie_ids:
+        MovieSimilarity.objects.filter(movie_id__in=set(movie_ids) - set(all_ids[columns].tolist())).delete()
+    return written
+
+
+def changed_movies():
+    """
+    Movies whose similarities may have moved since the last build: movies with relations written since,
+    plus every movie sharing a user with them (a changed column changes its norm and all its overlaps).
+    None when nothing was built yet.
+    """
+    last = MovieSimilarity.objects.aggregate(last=Max('computed_at'))['last']
+    if last is None:
+        return None
+    changed = UserMovieRelation.objects.filter(updated_at__gte=last).values('movie_id')
+    users = UserMovieRelation.objects.filter(movie_id__in=changed).values('user_id')
+    return set(UserMovieRelation.objects.filter(user_id__in=users).values_list('movie_id', flat=True).distinct())
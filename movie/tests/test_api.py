@@ -1,7 +1,8 @@
 import json
+from unittest import mock
 
 from django.contrib.auth.models import User
-from django.db import connection
+from django.db import IntegrityError, connection, transaction
 from django.db.models import Count, Case, When, Avg
 from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
@@ -10,7 +11,8 @@ from rest_framework.exceptions import ErrorDetail
 from rest_framework.test import APITestCase
 
 from movie.models import Movie, UserMovieRelation
-from movie.serializers import MoviesSerializer
+from movie.serializers import MovieDetailSerializer, MoviesSerializer
+from movie.views import UserMoviesRelationView
 
 
 class MovieApiTestCase(APITestCase):
@@ -43,9 +45,26 @@ class MovieApiTestCase(APITestCase):
         serializer_data = MoviesSerializer(queryset, many=True).data
 
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
         self.assertEqual(serializer_data[0]['rating'], '5.00')
         self.assertEqual(serializer_data[0]['annotated_likes'], 1)
+        self.assertNotIn('is_liked', response.data['results'][0])
+
+        # The requesting user's flags come from the same query
+        UserMovieRelation.objects.create(user=self.user, movie=self.movie_2, in_bookmarks=True)
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            self.assertEqual(2, len(queries))
+
+        flags = {movie['id']: (movie['is_liked'], movie['is_bookmarked'], movie['my_rate'])
+                 for movie in response.data['results']}
+        self.assertEqual({self.movie_1.id: (True, False, 5), self.movie_2.id: (False, True, None),
+                          self.movie_3.id: (False, False, None)}, flags)
+
+        response = self.client.get(reverse('movie-detail', args=(self.movie_1.id,)))
+        self.assertEqual((True, False, 5), (response.data['is_liked'], response.data['is_bookmarked'],
+                                            response.data['my_rate']))
 
     def test_02_get_filter(self):
         url = reverse('movie-list')
@@ -57,7 +76,7 @@ class MovieApiTestCase(APITestCase):
         serializer_data = MoviesSerializer(queryset, many=True).data
 
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
 
     def test_03_get_search(self):
         url = reverse('movie-list')
@@ -69,7 +88,7 @@ class MovieApiTestCase(APITestCase):
         serializer_data = MoviesSerializer(queryset, many=True).data
 
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
 
     def test_04_get_ordering(self):
         url = reverse('movie-list')
@@ -81,7 +100,7 @@ class MovieApiTestCase(APITestCase):
         serializer_data = MoviesSerializer(queryset, many=True).data
 
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
 
     def test_05_POST_create(self):
         self.assertEqual(3, Movie.objects.all().count())
@@ -133,10 +152,11 @@ class MovieApiTestCase(APITestCase):
         queryset = Movie.objects.filter(id__in=[self.movie_1.id]).annotate(
             annotated_likes=Count(Case(When(usermovierelation__like=True, then=1))),
         ).order_by('id')
-        serializer_data = MoviesSerializer(queryset, many=True).data
+        serializer_data = MovieDetailSerializer(queryset, many=True).data
 
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(serializer_data[0], response.data)
+        self.assertEqual({'1': 0, '2': 0, '3': 0, '4': 0, '5': 1}, response.data['rating_histogram'])
 
     def test_09_PUT_update_not_staff(self):
         self.user_not_staff = User.objects.create(username='test_username_not_staff', )
@@ -211,6 +231,50 @@ class MovieApiTestCase(APITestCase):
         self.movie_1.refresh_from_db()
         self.assertEqual(3, Movie.objects.all().count())
 
+    def test_14_get_readers_limit(self):
+        for i in range(4):
+            user = User.objects.create(username=f'reader_{i}')
+            UserMovieRelation.objects.create(user=user, movie=self.movie_1)
+        url = reverse('movie-list')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data={'readers_limit': 2})
+            self.assertEqual(2, len(queries))
+            self.assertIn('ROW_NUMBER', queries[1]['sql'])
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        movie = response.data['results'][0]
+        self.assertEqual(5, movie['readers_count'])
+        self.assertEqual(['test_username', 'reader_0'], [reader['username'] for reader in movie['readers']])
+        self.assertEqual(0, response.data['results'][1]['readers_count'])
+
+    def test_15_get_readers_limit_zero(self):
+        url = reverse('movie-detail', args=(self.movie_1.id,))
+        response = self.client.get(url, data={'readers_limit': 0})
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([], response.data['readers'])
+        self.assertEqual(1, response.data['readers_count'])
+
+    def test_16_stats(self):
+        user = User.objects.create(username='rater')
+        UserMovieRelation.objects.create(user=user, movie=self.movie_1, rate=3)
+        url = reverse('movie-stats')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, data={'ids': f'{self.movie_2.id},{self.movie_1.id},{self.movie_1.id}'})
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([self.movie_1.id, self.movie_2.id], [movie['id'] for movie in response.data['results']])
+        movie = response.data['results'][0]
+        self.assertEqual({'1': 0, '2': 0, '3': 1, '4': 0, '5': 1}, movie['rating_histogram'])
+        self.assertEqual(('4.00', 2, 1, 2), (movie['rating'], movie['rating_count'], movie['likes_count'],
+                                             movie['readers_count']))
+
+        for ids in ('one,2', f'{self.movie_1.id},{10 ** 30}', str(-10 ** 30)):
+            response = self.client.get(url, data={'ids': ids})
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code, ids)
+
 
 class MoviesRelationTestCase(APITestCase):
 
@@ -282,3 +346,166 @@ class MoviesRelationTestCase(APITestCase):
         response = self.client.patch(url, data=json_data,
                                      content_type='application/json')
         self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code, response.data)
+
+    def test_05_single_relation_per_user(self):
+        url = reverse('usermovierelation-detail', args=(self.movie_1.id,))
+        self.client.force_login(self.user)
+        for data in ({"like": True}, {"rate": 4}):
+            response = self.client.patch(url, data=json.dumps(data),
+                                         content_type='application/json')
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        relation = UserMovieRelation.objects.get(user=self.user, movie=self.movie_1)
+        self.assertTrue(relation.like)
+        self.assertEqual(4, relation.rate)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            UserMovieRelation.objects.create(user=self.user, movie=self.movie_1)
+
+    def test_06_bulk(self):
+        liked_at = UserMovieRelation.objects.create(user=self.user, movie=self.movie_1, like=True, rate=2).liked_at
+        url = reverse('usermovierelation-bulk')
+        data = [
+            {"movie": self.movie_1.id, "rate": 5},
+            {"movie": self.movie_2.id, "like": True, "in_bookmarks": True},
+            {"movie": self.movie_3.id, "rate": 3},
+        ]
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code, response.data)
+        bulk_queries = len(queries)
+
+        self.assertEqual([
+            {'movie': self.movie_1.id, 'like': True, 'in_bookmarks': False, 'rate': 5},
+            {'movie': self.movie_2.id, 'like': True, 'in_bookmarks': True, 'rate': None},
+            {'movie': self.movie_3.id, 'like': False, 'in_bookmarks': False, 'rate': 3},
+        ], response.data)
+
+        self.movie_1.refresh_from_db()
+        self.movie_2.refresh_from_db()
+        self.assertEqual('5.00', str(self.movie_1.rating))
+        self.assertEqual((1, 1, 1), (self.movie_1.likes_count, self.movie_1.readers_count, self.movie_1.rating_count))
+        self.assertEqual((1, 1, 1), (self.movie_2.likes_count, self.movie_2.bookmarks_count,
+                                     self.movie_2.readers_count))
+        # A new like is stamped, re-rating an existing one keeps its time
+        self.assertEqual({self.movie_1.id: liked_at, self.movie_3.id: None}, dict(
+            UserMovieRelation.objects.filter(movie__in=[self.movie_1, self.movie_3]).values_list('movie', 'liked_at')))
+        self.assertIsNotNone(UserMovieRelation.objects.get(movie=self.movie_2).liked_at)
+
+        more = [Movie.objects.create(title=f'Movie {i}') for i in range(10)]
+        data = [{"movie": movie.id, "like": True} for movie in more]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertLessEqual(len(queries), bulk_queries)
+        self.assertEqual(13, UserMovieRelation.objects.filter(user=self.user).count())
+
+    def test_07_bulk_invalid(self):
+        url = reverse('usermovierelation-bulk')
+        data = [{"movie": self.movie_1.id, "like": True}, {"movie": 0, "rate": 6}]
+        self.client.force_login(self.user)
+        response = self.client.post(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+        response = self.client.post(url, data=json.dumps([{"movie": 0}]), content_type='application/json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertFalse(UserMovieRelation.objects.exists())
+
+    def test_08_library(self):
+        other = User.objects.create(username='other')
+        UserMovieRelation.objects.create(user=self.user, movie=self.movie_1, like=True, rate=5)
+        UserMovieRelation.objects.create(user=self.user, movie=self.movie_2, in_bookmarks=True)
+        UserMovieRelation.objects.create(user=self.user, movie=self.movie_3, like=True)
+        UserMovieRelation.objects.create(user=other, movie=self.movie_2, like=True)
+
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('usermovierelation-likes'), data={'page_size': 1})
+        self.assertEqual(1, len(queries))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([self.movie_3.id], [entry['movie']['id'] for entry in response.data['results']])
+        self.assertEqual({'id': self.movie_3.id, 'title': 'Marvel One-Shot: All Hail the King',
+                          'tagline': 'All Hail the King', 'year': 2014, 'rating': None},
+                         response.data['results'][0]['movie'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([self.movie_1.id], [entry['movie']['id'] for entry in response.data['results']])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(reverse('usermovierelation-bookmarks'))
+        self.assertEqual([self.movie_2.id], [entry['movie']['id'] for entry in response.data['results']])
+        response = self.client.get(reverse('usermovierelation-ratings'))
+        self.assertEqual([(self.movie_1.id, 5)],
+                         [(entry['movie']['id'], entry['rate']) for entry in response.data['results']])
+
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse('usermovierelation-likes'))
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+    def test_09_bulk_conflict_keeps_omitted_flags(self):
+        # The relation appears between the locked read and the insert, as if created by a concurrent request
+        url = reverse('usermovierelation-bulk')
+        UserMovieRelation.objects.create(user=self.user, movie=self.movie_1, like=True, rate=2)
+        self.client.force_login(self.user)
+        locked_relations = UserMoviesRelationView.locked_relations
+        reads = []
+
+        def first_read_misses(user, movie_ids):
+            reads.append(movie_ids)
+            return {} if len(reads) == 1 else locked_relations(user, movie_ids)
+
+        with mock.patch.object(UserMoviesRelationView, 'locked_relations', staticmethod(first_read_misses)):
+            response = self.client.post(url, data=json.dumps([{"movie": self.movie_1.id, "in_bookmarks": True}]),
+                                        content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code, response.data)
+        self.assertEqual([{'movie': self.movie_1.id, 'like': True, 'in_bookmarks': True, 'rate': 2}], response.data)
+        self.movie_1.refresh_from_db()
+        self.assertEqual((1, 1, 1, 1), (self.movie_1.likes_count, self.movie_1.bookmarks_count,
+                                        self.movie_1.readers_count, self.movie_1.rating_count))
+
+    def test_10_bulk_too_many_items(self):
+        url = reverse('usermovierelation-bulk')
+        self.client.force_login(self.user)
+        data = [{"movie": 0}] * (UserMoviesRelationView.max_bulk_items + 1)
+        response = self.client.post(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual([f'At most {UserMoviesRelationView.max_bulk_items} items per request.'], response.data)
+
+
+class MovieExportTestCase(APITestCase):
+    def setUp(self):
+        user = User.objects.create(username='test_username')
+        self.movie_1 = Movie.objects.create(title='Loki',
+                                            tagline='Glorious Purpose, King',
+                                            year=2021)
+        self.movie_2 = Movie.objects.create(title='Hawkeye',
+                                            tagline='Holiday season, the best gifts are decorated with a bow',
+                                            year=2021)
+        self.movie_3 = Movie.objects.create(title='Marvel One-Shot: All Hail the King',
+                                            tagline='All Hail the King',
+                                            year=2014)
+        UserMovieRelation.objects.create(user=user, movie=self.movie_1, like=True, rate=5)
+
+    def expected(self, queryset):
+        return json.loads(json.dumps(MoviesSerializer(queryset.order_by('id'), many=True).data))
+
+    def test_01_json(self):
+        response = self.client.get(reverse('movie-export'), data={'year': 2021})
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.streaming)
+        self.assertEqual('application/json', response['Content-Type'])
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(self.expected(Movie.objects.filter(year=2021)), data)
+
+    def test_02_ndjson(self):
+        response = self.client.get(reverse('movie-export'), data={'output': 'ndjson'})
+
+        self.assertEqual('application/x-ndjson', response['Content-Type'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(self.expected(Movie.objects.all()), [json.loads(line) for line in lines])
+
+    def test_03_empty(self):
+        response = self.client.get(reverse('movie-export'), data={'year': 1900})
+        self.assertEqual([], json.loads(b''.join(response.streaming_content)))
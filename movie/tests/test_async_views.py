@@ -0,0 +1,49 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from movie.models import Movie, UserMovieRelation
+
+
+class AsyncMovieViewsTestCase(TestCase):
+    def setUp(self):
+        users = [User.objects.create(username=f'user{i}', email=f'user{i}@gmail.com') for i in range(1, 4)]
+        self.movie_1 = Movie.objects.create(title='Loki', tagline='Glorious Purpose, King', year=2021)
+        self.movie_2 = Movie.objects.create(title='Hawkeye', year=2021)
+        self.movie_3 = Movie.objects.create(title='Marvel One-Shot: All Hail the King', year=2014)
+        for user, rate in zip(users, (5, 4, None)):
+            UserMovieRelation.objects.create(user=user, movie=self.movie_1, like=True, rate=rate)
+
+    async def test_list(self):
+        for params in ({}, {'year': 2021}, {'readers_limit': 1}, {'page_size': 2}):
+            response = await self.async_client.get(reverse('async-movie-list'), params)
+            expected = await self.async_client.get(reverse('movie-list'), params)
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(json.loads(expected.content)['results'], json.loads(response.content)['results'])
+
+        response = await self.async_client.get(reverse('async-movie-list'), {'year': 'x'})
+        self.assertEqual(400, response.status_code)
+
+    async def test_pages(self):
+        response = await self.async_client.get(reverse('async-movie-list'), {'page_size': 2})
+        data = json.loads(response.content)
+        self.assertIsNone(data['previous'])
+        self.assertTrue(data['next'].startswith('http://testserver/async/movie/?'))
+
+        response = await self.async_client.get(data['next'])
+        data = json.loads(response.content)
+        self.assertEqual([self.movie_3.id], [movie['id'] for movie in data['results']])
+        self.assertIsNone(data['next'])
+
+    async def test_detail(self):
+        response = await self.async_client.get(reverse('async-movie-detail', args=(self.movie_1.id,)))
+        expected = await self.async_client.get(reverse('movie-detail', args=(self.movie_1.id,)))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(expected.content, response.content)
+
+        response = await self.async_client.get(reverse('async-movie-detail', args=(0,)))
+        self.assertEqual(404, response.status_code)
+        response = await self.async_client.post(reverse('async-movie-detail', args=(self.movie_1.id,)))
+        self.assertEqual(405, response.status_code)
@@ -0,0 +1,39 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from movie.models import Movie
+
+
+class BenchApiTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.baseline = os.path.join(directory.name, 'baseline.json')
+
+    def bench(self, **kwargs):
+        options = {'movies': 30, 'users': 3, 'relations': 5, 'repeat': 2, 'baseline': self.baseline, **kwargs}
+        call_command('bench_api', stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_baseline(self):
+        self.bench(save_baseline=True)
+        with open(self.baseline) as file:
+            stored = json.load(file)
+
+        self.assertEqual({'list', 'detail', 'filter', 'search', 'ordering', 'relation-patch'},
+                         set(stored['scenarios']))
+        self.assertEqual(2, stored['scenarios']['list']['queries'])
+        self.assertEqual(0, Movie.objects.count())
+
+        # Another data size only compares query counts
+        self.bench(movies=40)
+
+        stored['scenarios']['list']['queries'] = 1
+        with open(self.baseline, 'w') as file:
+            json.dump(stored, file)
+        with self.assertRaisesMessage(CommandError, 'list: 1 -> 2 queries'):
+            self.bench(movies=40)
@@ -0,0 +1,182 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework.test import APITestCase
+
+from movie.cache import cache_stats
+from movie.models import Movie, UserMovieRelation
+
+
+class MovieCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_username')
+
+        self.movie_1 = Movie.objects.create(title='Loki',
+                                            tagline='Glorious Purpose, King',
+                                            year=2021)
+        self.movie_2 = Movie.objects.create(title='Hawkeye',
+                                            tagline='Holiday season, the best gifts are decorated with a bow',
+                                            year=2021)
+
+    def test_01_hit(self):
+        url = reverse('movie-list')
+        first = self.client.get(url, data={'year': 2021, 'ordering': '-year'})
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url, data={'ordering': '-year', 'year': 2021})
+        self.assertEqual(0, len(queries))
+
+        self.assertEqual('MISS', first['X-Cache'])
+        self.assertEqual('HIT', second['X-Cache'])
+        self.assertEqual(first.data, second.data)
+        self.assertEqual({'hits': 1, 'misses': 1}, cache_stats())
+
+    def test_02_params_are_part_of_the_key(self):
+        url = reverse('movie-list')
+        self.client.get(url, data={'year': 2021})
+        response = self.client.get(url, data={'year': 2014})
+
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual([], response.data['results'])
+
+    def test_03_relation_write_invalidates(self):
+        url = reverse('movie-detail', args=(self.movie_1.id,))
+        self.client.get(url)
+
+        UserMovieRelation.objects.create(user=self.user, movie=self.movie_1, like=True, rate=4)
+        response = self.client.get(url)
+
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual(1, response.data['annotated_likes'])
+        self.assertEqual('4.00', response.data['rating'])
+
+    def test_04_movie_write_invalidates(self):
+        url = reverse('movie-list')
+        self.client.get(url)
+
+        self.movie_2.title = 'New title'
+        self.movie_2.save()
+        response = self.client.get(url)
+
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual('New title', response.data['results'][1]['title'])
+
+    def test_05_authenticated_not_cached(self):
+        url = reverse('movie-list')
+        self.client.force_login(self.user)
+        self.client.get(url)
+        response = self.client.get(url)
+
+        self.assertNotIn('X-Cache', response)
+        self.assertEqual({'hits': 0, 'misses': 0}, cache_stats())
+
+    @override_settings(MOVIE_CACHE_TIMEOUT=0)
+    def test_06_timeout_from_settings(self):
+        url = reverse('movie-list')
+        self.client.get(url)
+        response = self.client.get(url)
+
+        self.assertEqual('MISS', response['X-Cache'])
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_username')
+
+        self.movie_1 = Movie.objects.create(title='Loki',
+                                            tagline='Glorious Purpose, King',
+                                            year=2021)
+        self.movie_2 = Movie.objects.create(title='Hawkeye',
+                                            tagline='Holiday season, the best gifts are decorated with a bow',
+                                            year=2021)
+
+    def test_01_list_etag(self):
+        url = reverse('movie-list')
+        etag = self.client.get(url)['ETag']
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(1, len(queries))
+        self.assertNotIn('JOIN', queries[0]['sql'])
+
+    def test_02_list_etag_from_cache(self):
+        url = reverse('movie-list')
+        etag = self.client.get(url)['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(0, len(queries))
+
+    def test_03_list_changed(self):
+        url = reverse('movie-list')
+        etag = self.client.get(url)['ETag']
+
+        UserMovieRelation.objects.create(user=self.user, movie=self.movie_2, like=True)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+        self.assertEqual(1, response.data['results'][1]['annotated_likes'])
+
+    def test_04_detail_etag(self):
+        url = reverse('movie-detail', args=(self.movie_1.id,))
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        cache.clear()
+
+        self.assertEqual(304, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+        self.assertEqual(304, self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code)
+
+        self.movie_1.title = 'New title'
+        self.movie_1.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('New title', response.data['title'])
+
+    def test_05_detail_not_found(self):
+        url = reverse('movie-detail', args=(0,))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"anything"')
+        self.assertEqual(404, response.status_code)
+
+        url = reverse('movie-detail', args=('abc',))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"anything"')
+        self.assertEqual(404, response.status_code)
+
+    def test_06_list_etag_per_user(self):
+        url = reverse('movie-list')
+        UserMovieRelation.objects.create(user=self.user, movie=self.movie_1, like=True)
+        other = User.objects.create(username='other')
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Cookie', response['Vary'])
+        self.assertEqual(304, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+
+        self.client.force_authenticate(other)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+
+    def test_07_list_without_last_modified(self):
+        url = reverse('movie-list')
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+
+        # A deletion changes the page without raising any updated_at on it
+        self.movie_1.delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([self.movie_2.id], [movie['id'] for movie in response.data['results']])
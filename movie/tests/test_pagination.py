@@ -0,0 +1,78 @@
+from base64 import urlsafe_b64encode
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from movie.models import Movie, UserMovieRelation
+
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.movies = [Movie.objects.create(title=f'Movie {i}', year=2000 + i % 3) for i in range(7)]
+
+        for i, username in enumerate(('user1', 'user2', 'user3')):
+            user = User.objects.create(username=username)
+            for movie in self.movies[:i + 1]:
+                UserMovieRelation.objects.create(user=user, movie=movie, like=True)
+
+    def _walk(self, params):
+        url, pages = reverse('movie-list'), []
+        while url:
+            response = self.client.get(url, data=params if not pages else None)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            pages.append(response.data)
+            url = response.data['next']
+        return pages
+
+    def test_01_pages_by_id(self):
+        pages = self._walk({'page_size': 3})
+
+        self.assertEqual(3, len(pages))
+        ids = [movie['id'] for page in pages for movie in page['results']]
+        self.assertEqual([movie.id for movie in self.movies], ids)
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_02_pages_by_year_with_ties(self):
+        pages = self._walk({'page_size': 2, 'ordering': '-year'})
+
+        ids = [movie['id'] for page in pages for movie in page['results']]
+        expected = [movie.id for movie in sorted(self.movies, key=lambda m: (-m.year, m.id))]
+        self.assertEqual(expected, ids)
+
+    def test_03_previous(self):
+        first = self.client.get(reverse('movie-list'), data={'page_size': 3}).data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+
+        self.assertEqual(first['results'], back['results'])
+
+    def test_04_annotated_likes_per_page(self):
+        first = self.client.get(reverse('movie-list'), data={'page_size': 2}).data
+        second = self.client.get(first['next']).data
+
+        likes = [movie['annotated_likes'] for movie in first['results'] + second['results']]
+        self.assertEqual([3, 2, 1, 0], likes)
+
+    def test_05_query_count(self):
+        first = self.client.get(reverse('movie-list'), data={'page_size': 2}).data
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(first['next'])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(2, len(queries))
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+
+    def test_06_invalid_cursor(self):
+        response = self.client.get(reverse('movie-list'), data={'cursor': 'garbage'})
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+        # Well-formed JSON with values that don't fit the ordering (id, a string) or are missing
+        for payload in ('{"v":["a"],"id":"x"}', '{"v":["a"]}', '{"v":[]}', '{"v":[null]}', '{"v":[[1]]}',
+                        '{"v":[%d]}' % 10 ** 30):
+            cursor = urlsafe_b64encode(payload.encode()).decode()
+            response = self.client.get(reverse('movie-list'), data={'cursor': cursor})
+            self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code, payload)
@@ -0,0 +1,38 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from movie.models import Movie
+
+
+@override_settings(PERF_SAMPLE_RATE=1.0)
+class PerformanceMiddlewareTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        Movie.objects.create(title='Loki', tagline='Glorious Purpose, King', year=2021)
+
+    def test_sampled(self):
+        self.client.force_authenticate(self.user)
+        with self.assertLogs('movie.perf', 'INFO') as logs:
+            response = self.client.get(reverse('movie-list'))
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(('GET', '/movie/', 200), (record['method'], record['path'], record['status']))
+        self.assertEqual(2, record['db_queries'])
+        self.assertEqual(len(response.content), record['size'])
+        self.assertIn('serialize_ms', record)
+        self.assertIn('render_ms', record)
+
+        timing = response['Server-Timing']
+        self.assertTrue(timing.startswith('total;dur='))
+        self.assertIn('desc="2 queries"', timing)
+        self.assertIn('serialize;dur=', timing)
+
+    @override_settings(PERF_SAMPLE_RATE=0.0)
+    def test_disabled(self):
+        with self.assertNoLogs('movie.perf'):
+            response = self.client.get(reverse('movie-list'))
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -0,0 +1,54 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from movie.models import Movie, UserMovieRelation
+from movie.querycheck import QueryDetector, QueryIssues, normalize
+
+
+class NormalizeTestCase(TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize('SELECT "movie_movie"."id" FROM "movie_movie" WHERE "movie_movie"."id" = 1'),
+                         normalize('SELECT "movie_movie"."id"  FROM "movie_movie"\nWHERE "movie_movie"."id" = 25'))
+        self.assertEqual('SELECT ? FROM t WHERE a IN (?) AND b = ?',
+                         normalize("SELECT 'x' FROM t WHERE a IN (%s, %s, %s) AND b = 'it''s'"))
+
+
+class QueryDetectorTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username', is_staff=True, is_superuser=True)
+        for index in range(8):
+            movie = Movie.objects.create(title=f'Movie {index}', year=2021)
+            UserMovieRelation.objects.create(user=self.user, movie=movie, like=True)
+
+    def test_n_plus_one(self):
+        with self.assertRaisesMessage(QueryIssues, '8 x'):
+            with QueryDetector(repeat_threshold=5):
+                [str(relation) for relation in UserMovieRelation.objects.all()]
+
+        with QueryDetector(repeat_threshold=5, raise_on_issue=False) as detector:
+            [str(relation) for relation in UserMovieRelation.objects.select_related('user', 'movie')]
+        self.assertEqual([], detector.issues)
+
+    def test_slow(self):
+        with QueryDetector(slow_ms=0.000001, raise_on_issue=False) as detector:
+            Movie.objects.count()
+        self.assertEqual(['slow'], [issue['type'] for issue in detector.issues])
+
+    def test_views(self):
+        self.client.force_login(self.user)
+        with QueryDetector(repeat_threshold=3):
+            self.client.get(reverse('movie-list'))
+            self.client.get(reverse('movie-detail', args=(Movie.objects.first().id,)))
+        with QueryDetector(repeat_threshold=3):
+            self.client.get(reverse('admin:movie_usermovierelation_changelist'))
+
+    @override_settings(QUERY_DETECTOR=True, QUERY_DETECTOR_SLOW_MS=0.000001)
+    def test_middleware(self):
+        self.client.force_authenticate(self.user)
+        with self.assertLogs('movie.queries', 'WARNING') as logs:
+            response = self.client.get(reverse('movie-list'))
+        self.assertEqual(200, response.status_code)
+        self.assertIn('"type": "slow"', logs.output[0])
+        self.assertIn('"path": "/movie/"', logs.output[0])
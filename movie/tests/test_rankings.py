@@ -0,0 +1,88 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from movie.models import Movie, MovieRanking, UserMovieRelation
+from movie.rankings import refresh_rankings, top_rated
+
+
+class RankingsTestCase(APITestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'user{i}') for i in range(4)]
+        self.movie_1 = Movie.objects.create(title='Loki', year=2021)
+        self.movie_2 = Movie.objects.create(title='Hawkeye', year=2021)
+        self.movie_3 = Movie.objects.create(title='Echo', year=2023)
+
+        # One 5 against four 4s: the Bayesian average prefers the better-supported movie
+        UserMovieRelation.objects.create(user=self.users[0], movie=self.movie_1, rate=5)
+        for user in self.users:
+            UserMovieRelation.objects.create(user=user, movie=self.movie_2, rate=4, like=True)
+        UserMovieRelation.objects.create(user=self.users[0], movie=self.movie_3, like=True, rate=1)
+        UserMovieRelation.objects.create(user=self.users[1], movie=self.movie_3, like=True, rate=1)
+        UserMovieRelation.objects.create(user=self.users[2], movie=self.movie_3, rate=1)
+        UserMovieRelation.objects.create(user=self.users[3], movie=self.movie_3, rate=1)
+
+    def test_top_rated(self):
+        self.assertEqual([self.movie_2.id, self.movie_1.id, self.movie_3.id],
+                         [movie_id for movie_id, _ in top_rated(10, min_votes=2)])
+        self.assertEqual([self.movie_1.id, self.movie_2.id, self.movie_3.id],
+                         [movie_id for movie_id, _ in top_rated(10, min_votes=0)])
+
+    def test_trending(self):
+        UserMovieRelation.objects.filter(movie=self.movie_2).update(liked_at=timezone.now() - timedelta(days=30))
+        # Re-rating an old like doesn't make it trending again
+        relation = UserMovieRelation.objects.filter(movie=self.movie_2).first()
+        relation.rate = 5
+        relation.save()
+        refresh_rankings(['most_liked', 'trending'])
+
+        self.assertEqual([(1, self.movie_2.id, 4.0), (2, self.movie_3.id, 2.0)], list(
+            MovieRanking.objects.filter(board='most_liked').order_by('position')
+            .values_list('position', 'movie_id', 'score')))
+        self.assertEqual([self.movie_3.id], list(
+            MovieRanking.objects.filter(board='trending').values_list('movie_id', flat=True)))
+
+    def test_liked_at(self):
+        relation = UserMovieRelation.objects.get(user=self.users[0], movie=self.movie_3)
+        liked_at = relation.liked_at
+        self.assertIsNotNone(liked_at)
+
+        relation.in_bookmarks = True
+        relation.save()
+        self.assertEqual(liked_at, relation.liked_at)
+
+        relation.like = False
+        relation.save()
+        self.assertIsNone(relation.liked_at)
+        relation.like = True
+        relation.save()
+        self.assertGreater(relation.liked_at, liked_at)
+        self.assertIsNone(UserMovieRelation.objects.get(user=self.users[2], movie=self.movie_3).liked_at)
+
+    def test_api(self):
+        call_command('refresh_rankings', stdout=StringIO())
+        call_command('refresh_rankings', board=['top_rated'], stdout=StringIO())
+        self.assertEqual(3, MovieRanking.objects.filter(board='top_rated').count())
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('movie-top-rated'), {'page_size': 2})
+        self.assertEqual(1, len(queries))
+        self.assertEqual([1, 2], [entry['position'] for entry in response.data['results']])
+        self.assertEqual({'id': self.movie_2.id, 'title': 'Hawkeye', 'tagline': '', 'year': 2021, 'rating': '4.00'},
+                         response.data['results'][0]['movie'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([3], [entry['position'] for entry in response.data['results']])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(reverse('movie-trending'))
+        self.assertEqual([self.movie_2.id, self.movie_3.id],
+                         [entry['movie']['id'] for entry in response.data['results']])
+        self.assertEqual(200, self.client.get(reverse('movie-most-liked')).status_code)
@@ -1,5 +1,11 @@
+from decimal import Decimal
+from threading import Barrier, Thread
+from unittest import skipUnless
+
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.db import connection
+from django.db.models import Avg, Count, Q, Sum
+from django.test import TestCase, TransactionTestCase
 
 from movie.models import Movie, UserMovieRelation
 from movie.utils import set_rating
@@ -26,3 +32,50 @@ class SetRatingTestCase(TestCase):
         set_rating(self.movie_1)
         self.movie_1.refresh_from_db()
         self.assertEqual('4.67', str(self.movie_1.rating))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs concurrent writers: run against PostgreSQL, e.g. '
+                                                'DJANGO_SETTINGS_MODULE=films.settings.dev manage.py test')
+class ConcurrentRatingTestCase(TransactionTestCase):
+    # SQLite's in-memory test database rejects concurrent writers ("database table is locked")
+    # instead of queueing them, and ignores select_for_update, so the race can't be exercised there
+    threads = 8
+    rounds = 10
+
+    def setUp(self):
+        self.movie_1 = Movie.objects.create(title='Loki',
+                                            tagline='Glorious Purpose, King',
+                                            year=2021)
+        self.users = [User.objects.create(username=f'user{i}') for i in range(self.threads)]
+
+    def _rate(self, user, barrier, errors):
+        try:
+            barrier.wait()
+            relation = UserMovieRelation.objects.create(user=user, movie_id=self.movie_1.id, rate=1)
+            for i in range(self.rounds):
+                relation.rate = i % 5 + 1
+                relation.like = not relation.like
+                relation.save()
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    def test_concurrent_rates(self):
+        barrier, errors = Barrier(self.threads), []
+        workers = [Thread(target=self._rate, args=(user, barrier, errors)) for user in self.users]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual([], errors)
+        expected = UserMovieRelation.objects.filter(movie=self.movie_1).aggregate(
+            rating_sum=Sum('rate'), rating_count=Count('rate'), rating=Avg('rate'),
+            likes_count=Count('id', filter=Q(like=True)))
+        self.movie_1.refresh_from_db()
+        self.assertEqual(expected['rating_sum'], self.movie_1.rating_sum)
+        self.assertEqual(expected['rating_count'], self.movie_1.rating_count)
+        self.assertEqual(expected['likes_count'], self.movie_1.likes_count)
+        self.assertEqual(self.threads, self.movie_1.readers_count)
+        self.assertEqual(round(Decimal(expected['rating']), 2), self.movie_1.rating)
@@ -0,0 +1,50 @@
+import datetime
+import io
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from movie import renderers
+from movie.renderers import FastJSONParser, FastJSONRenderer
+
+
+class FastJSONRendererTestCase(SimpleTestCase):
+    data = {
+        'results': [
+            {'id': 1, 'title': 'Loki   Ø', 'rating': '4.67', 'score': Decimal('4.5'), 'year': 2021,
+             'readers': [{'username': 'user1'}], 'description': None, 'liked': True},
+        ],
+        'updated': datetime.datetime(2023, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+        'local': datetime.datetime(2023, 5, 1, 12, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=2))),
+        'day': datetime.date(2023, 5, 1),
+        'label': gettext_lazy('Movie'),
+        1: 'int key',
+        'ratio': 0.1,
+    }
+
+    def test_same_bytes(self):
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(expected, FastJSONRenderer().render(self.data))
+
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(expected, FastJSONRenderer().render(self.data))
+
+    def test_indent_and_large_ints(self):
+        renderer = FastJSONRenderer()
+        self.assertEqual(JSONRenderer().render(self.data, 'application/json; indent=2'),
+                         renderer.render(self.data, 'application/json; indent=2'))
+        self.assertEqual(b'{"id":36893488147419103232}', renderer.render({'id': 2 ** 65}))
+        self.assertEqual(b'', renderer.render(None))
+
+    def test_parser(self):
+        body = '{"title":"Loki Ø","rate":5,"items":[{"movie":1,"like":true}]}'.encode()
+        self.assertEqual(JSONParser().parse(io.BytesIO(body)), FastJSONParser().parse(io.BytesIO(body)))
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"title":'))
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"rate":NaN}'))
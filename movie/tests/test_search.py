@@ -0,0 +1,175 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from movie.models import Movie, UserMovieRelation
+from movie.search import InvertedIndex, TrigramIndex, full_text_search, get_index, is_statement_timeout, trigrams
+
+
+class InvertedIndexTestCase(TestCase):
+    def setUp(self):
+        self.index = InvertedIndex([
+            (1, 'Loki', 'Glorious Purpose, King'),
+            (2, 'Hawkeye', 'Holiday season, the best gifts are decorated with a bow'),
+            (3, 'Marvel One-Shot: All Hail the King', 'All Hail the King'),
+        ])
+
+    def test_01_all_terms_required(self):
+        self.assertEqual({1, 3}, set(self.index.search(['king'])))
+        self.assertEqual({3}, set(self.index.search(['hail', 'KING'])))
+        self.assertEqual({}, self.index.search(['king', 'holiday']))
+        self.assertEqual({}, self.index.search(['...']))
+
+    def test_02_rank(self):
+        ranks = self.index.search(['king'])
+        self.assertGreater(ranks[3], ranks[1])
+
+
+class FullTextSearchApiTestCase(APITestCase):
+    def setUp(self):
+        self.movie_1 = Movie.objects.create(title='Loki',
+                                            tagline='Glorious Purpose, King',
+                                            year=2021)
+        self.movie_2 = Movie.objects.create(title='Hawkeye',
+                                            tagline='Holiday season, the best gifts are decorated with a bow',
+                                            year=2021)
+        self.movie_3 = Movie.objects.create(title='Marvel One-Shot: All Hail the King',
+                                            tagline='All Hail the King',
+                                            year=2014)
+
+    def test_01_search(self):
+        response = self.client.get(reverse('movie-list'), data={'search': 'holiday gifts'})
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([self.movie_2.id], [movie['id'] for movie in response.data['results']])
+
+    def test_02_order_by_rank(self):
+        response = self.client.get(reverse('movie-list'), data={'search': 'King', 'ordering': '-search_rank'})
+
+        self.assertEqual([self.movie_3.id, self.movie_1.id], [movie['id'] for movie in response.data['results']])
+
+    def test_03_rank_pages(self):
+        first = self.client.get(reverse('movie-list'),
+                                data={'search': 'King', 'ordering': '-search_rank', 'page_size': 1}).data
+        second = self.client.get(first['next']).data
+
+        self.assertEqual([self.movie_3.id], [movie['id'] for movie in first['results']])
+        self.assertEqual([self.movie_1.id], [movie['id'] for movie in second['results']])
+        self.assertIsNone(second['next'])
+
+    def test_04_rank_ordering_ignored_without_search(self):
+        response = self.client.get(reverse('movie-list'), data={'ordering': '-search_rank'})
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(3, len(response.data['results']))
+
+    def test_05_index_follows_writes(self):
+        self.assertFalse(full_text_search(Movie.objects.all(), ['stranger']).exists())
+
+        Movie.objects.create(title='Stranger Things', tagline='There is no end without a beginning', year=2016)
+
+        self.assertEqual(['Stranger Things'],
+                         list(full_text_search(Movie.objects.all(), ['stranger']).values_list('title', flat=True)))
+
+    def test_06_index_ignores_counter_updates(self):
+        index = get_index(Movie.objects.all())
+        user = User.objects.create(username='user1')
+        UserMovieRelation.objects.create(user=user, movie=self.movie_1, like=True, rate=5)
+        self.assertIs(index, get_index(Movie.objects.all()))
+
+        movie = Movie.objects.get(pk=self.movie_1.pk)
+        movie.tagline = 'Glorious Purpose, Variant'
+        movie.save()
+        self.assertIsNot(index, get_index(Movie.objects.all()))
+        self.assertEqual([self.movie_1.id],
+                         list(full_text_search(Movie.objects.all(), ['variant']).values_list('id', flat=True)))
+
+        movie = Movie.objects.only('id', 'year').get(pk=self.movie_2.pk)
+        movie.year = 2022
+        movie.save()
+        self.assertEqual(self.movie_2.text_updated_at, Movie.objects.get(pk=self.movie_2.pk).text_updated_at)
+
+    def test_07_many_matches(self):
+        Movie.objects.create(title='The Kingdom', tagline='', year=2007)
+        with mock.patch('movie.search.MAX_SEARCH_IDS', 1):
+            with CaptureQueriesContext(connection) as queries:
+                matched = set(full_text_search(Movie.objects.all(), ['KING'], rank=False).values_list('id', flat=True))
+            self.assertEqual({self.movie_1.id, self.movie_3.id}, matched)
+            self.assertNotIn(' IN (', queries[-1]['sql'])
+
+            ranked = list(full_text_search(Movie.objects.all(), ['king']).order_by('-search_rank')
+                          .values_list('id', flat=True))
+            self.assertEqual([self.movie_3.id], ranked)
+
+
+class TrigramIndexTestCase(TestCase):
+    def test_01_trigrams(self):
+        self.assertEqual({'  c', ' ca', 'cat', 'at '}, trigrams('Cat'))
+
+    def test_02_similarity(self):
+        index = TrigramIndex([(1, 'Loki'), (2, 'Hawkeye'), (3, 'Marvel One-Shot: All Hail the King')])
+
+        self.assertEqual([1], [movie_id for movie_id, _ in index.search('Lokki')])
+        self.assertEqual([2], [movie_id for movie_id, _ in index.search('Hawk eye')])
+        self.assertAlmostEqual(4 / 7, index.search('Lokki')[0][1])
+        self.assertEqual([], index.search('Stranger'))
+
+    def test_03_candidates(self):
+        index = TrigramIndex([(1, 'Loki'), (2, 'Lokis'), (3, 'Lok')])
+        index.max_candidates = 1
+        self.assertEqual([2], [movie_id for movie_id, _ in index.search('Lokis')])
+
+    def test_04_budget(self):
+        # The budget runs out after the rarest trigram (one only 'Lokis' has): its movie is still found
+        index = TrigramIndex([(1, 'Loki'), (2, 'Lokis'), (3, 'Lok')])
+        with mock.patch('movie.search.time.perf_counter', side_effect=[0.0, 1.0, 2.0]):
+            self.assertEqual([(2, 1 / 11)], index.search('Lokis', threshold=0, budget=0.5))
+
+
+class StatementTimeoutTestCase(TestCase):
+    def test_01_is_statement_timeout(self):
+        def database_error(code):
+            cause = Exception()
+            cause.pgcode = code
+            exc = OperationalError()
+            exc.__cause__ = cause
+            return exc
+
+        self.assertTrue(is_statement_timeout(database_error('57014')))
+        self.assertFalse(is_statement_timeout(database_error('42P01')))
+        self.assertFalse(is_statement_timeout(OperationalError()))
+
+
+class FuzzySearchApiTestCase(APITestCase):
+    def setUp(self):
+        self.movie_1 = Movie.objects.create(title='Loki',
+                                            tagline='Glorious Purpose, King',
+                                            year=2021)
+        self.movie_2 = Movie.objects.create(title='Hawkeye',
+                                            tagline='Holiday season, the best gifts are decorated with a bow',
+                                            year=2021)
+        self.movie_3 = Movie.objects.create(title='Loki 2',
+                                            tagline='',
+                                            year=2023)
+
+    def test_01_fuzzy(self):
+        response = self.client.get(reverse('movie-fuzzy'), data={'q': 'Lokki'})
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        results = response.data['results']
+        self.assertEqual([self.movie_1.id, self.movie_3.id], [movie['id'] for movie in results])
+        self.assertGreater(results[0]['similarity'], results[1]['similarity'])
+
+    def test_02_fuzzy_limit(self):
+        response = self.client.get(reverse('movie-fuzzy'), data={'q': 'Lokki', 'limit': 1})
+        self.assertEqual([self.movie_1.id], [movie['id'] for movie in response.data['results']])
+
+    def test_03_fuzzy_empty(self):
+        response = self.client.get(reverse('movie-fuzzy'))
+        self.assertEqual({'results': []}, response.data)
@@ -1,9 +1,10 @@
 from django.contrib.auth.models import User
 from django.db.models import Count, Case, When
 from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
 
 from movie.models import Movie, UserMovieRelation
-from movie.serializers import MoviesSerializer
+from movie.serializers import MovieRowSerializer, MoviesSerializer
 
 
 class MovieSerializerTestCase(TestCase):
@@ -59,6 +60,7 @@ class MovieSerializerTestCase(TestCase):
                         "email": "user3@gmail.com"
                     },
                 ],
+                'readers_count': 3,
                 'annotated_likes': 3,
                 'rating': '4.67',
             },
@@ -82,6 +84,7 @@ class MovieSerializerTestCase(TestCase):
                         "email": "user3@gmail.com"
                     },
                 ],
+                'readers_count': 3,
                 'annotated_likes': 2,
                 'rating': '3.50',
             },
@@ -92,3 +95,32 @@ class MovieSerializerTestCase(TestCase):
         # print(f"expected_data => {expected_data}")
 
         self.assertEqual(expected_data, data)
+
+
+class MovieRowSerializerTestCase(TestCase):
+    def setUp(self):
+        users = [User.objects.create(username=f'user{i}', email=f'user{i}@gmail.com') for i in range(1, 4)]
+        self.movie_1 = Movie.objects.create(title='Loki', tagline='Glorious Purpose, King', year=2021)
+        self.movie_2 = Movie.objects.create(title='Hawkeye', year=2021, description='Clint Barton')
+        self.movie_3 = Movie.objects.create(title='Echo', year=2023)
+
+        for user, rate in zip(users, (5, 4, None)):
+            UserMovieRelation.objects.create(user=user, movie=self.movie_1, like=True, rate=rate)
+        UserMovieRelation.objects.create(user=users[1], movie=self.movie_2, rate=3)
+
+    def test_same_output(self):
+        queryset = Movie.objects.all().order_by('id')
+        expected = MoviesSerializer(queryset, many=True).data
+        data = MovieRowSerializer(MovieRowSerializer.rows(queryset)).data
+
+        self.assertEqual(expected, data)
+        self.assertEqual(JSONRenderer().render(expected), JSONRenderer().render(data))
+
+    def test_readers_limit(self):
+        rows = MovieRowSerializer.rows(Movie.objects.filter(id=self.movie_1.id))
+        data = MovieRowSerializer(rows, readers_limit=2).data
+        self.assertEqual(['user1', 'user2'], [reader['username'] for reader in data[0]['readers']])
+
+        with self.assertNumQueries(1):
+            data = MovieRowSerializer(rows.all(), readers_limit=0).data
+        self.assertEqual([], data[0]['readers'])
@@ -0,0 +1,64 @@
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from movie import similarity
+from movie.models import Movie, MovieSimilarity, UserMovieRelation
+
+
+class SimilarMoviesTestCase(APITestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'user{i}') for i in range(3)]
+        self.movie_1 = Movie.objects.create(title='Loki', year=2021)
+        self.movie_2 = Movie.objects.create(title='Hawkeye', year=2021)
+        self.movie_3 = Movie.objects.create(title='Echo', year=2023)
+
+    def test_similar(self):
+        now = timezone.now()
+        MovieSimilarity.objects.bulk_create([
+            MovieSimilarity(movie=self.movie_1, rank=2, similar=self.movie_3, score=0.25, computed_at=now),
+            MovieSimilarity(movie=self.movie_1, rank=1, similar=self.movie_2, score=0.75, computed_at=now),
+        ])
+        url = reverse('movie-similar', args=(self.movie_1.id,))
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual([self.movie_2.id, self.movie_3.id], [row['movie']['id'] for row in response.data['results']])
+        self.assertEqual([1, 2], [row['rank'] for row in response.data['results']])
+
+        response = self.client.get(reverse('movie-similar', args=(self.movie_2.id,)))
+        self.assertEqual([], response.data['results'])
+        response = self.client.get(reverse('movie-similar', args=(self.movie_3.id + 100,)))
+        self.assertEqual(404, response.status_code)
+        response = self.client.get(reverse('movie-similar', args=('abc',)))
+        self.assertEqual(404, response.status_code)
+
+    def test_command_requires_numpy(self):
+        with mock.patch.object(similarity, 'np', None), self.assertRaises(CommandError):
+            call_command('build_similar_movies', stdout=StringIO())
+
+    @skipUnless(similarity.np is not None, 'NumPy and SciPy are not installed')
+    def test_build(self):
+        # Loki and Hawkeye share two users, Echo shares one with Hawkeye only
+        for user in self.users[:2]:
+            UserMovieRelation.objects.create(user=user, movie=self.movie_1, like=True)
+            UserMovieRelation.objects.create(user=user, movie=self.movie_2, like=True)
+        UserMovieRelation.objects.create(user=self.users[2], movie=self.movie_2)
+        UserMovieRelation.objects.create(user=self.users[2], movie=self.movie_3, rate=5)
+
+        call_command('build_similar_movies', stdout=StringIO())
+        neighbours = list(MovieSimilarity.objects.filter(movie=self.movie_2).values_list('similar_id', flat=True)
+                          .order_by('rank'))
+        self.assertEqual([self.movie_1.id, self.movie_3.id], neighbours)
+        self.assertEqual([self.movie_2.id], list(MovieSimilarity.objects.filter(movie=self.movie_1)
+                                                 .values_list('similar_id', flat=True)))
+
+        UserMovieRelation.objects.create(user=self.users[0], movie=self.movie_3, like=True)
+        self.assertIn(self.movie_3.id, similarity.changed_movies())
+        call_command('build_similar_movies', '--changed', stdout=StringIO())
+        self.assertIn(self.movie_3.id, MovieSimilarity.objects.filter(movie=self.movie_1)
+                      .values_list('similar_id', flat=True))
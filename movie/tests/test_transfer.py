@@ -0,0 +1,139 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from movie.models import Movie, UserMovieRelation
+
+
+class MovieTransferTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def call(self, *args, **kwargs):
+        call_command(*args, stdout=StringIO(), stderr=StringIO(), **kwargs)
+
+    def test_01_import_csv(self):
+        with open(self.path('movies.csv'), 'w') as file:
+            file.write('id,title,tagline,description,year\n'
+                       '10,Loki,"Glorious Purpose, King",,2021\n'
+                       '11,Hawkeye,Holiday season,A bow,2021\n'
+                       '12,Marvel One-Shot: All Hail the King,All Hail the King,,2014\n')
+        with open(self.path('relations.csv'), 'w') as file:
+            file.write('user,movie,like,in_bookmarks,rate\n'
+                       'user1,10,True,False,5\n'
+                       'user2,10,True,True,4\n'
+                       'user1,11,False,False,\n')
+
+        self.call('import_movies', self.path('movies.csv'), relations=self.path('relations.csv'), batch_size=2,
+                  create_users=True)
+
+        self.assertEqual(3, Movie.objects.count())
+        loki = Movie.objects.get(id=10)
+        self.assertEqual(('Glorious Purpose, King', None, 2021), (loki.tagline, loki.description, loki.year))
+        self.assertEqual((2, 1, 2, '4.50'), (loki.likes_count, loki.bookmarks_count, loki.readers_count,
+                                             str(loki.rating)))
+        self.assertEqual(2, User.objects.count())
+        self.assertEqual(13, Movie.objects.create(title='Next').id)
+
+    def test_02_round_trip_jsonl(self):
+        user = User.objects.create(username='user1')
+        movie = Movie.objects.create(title='Loki', tagline='Glorious Purpose, King', year=2021)
+        Movie.objects.create(title='Hawkeye', description='Holiday season', year=2021)
+        UserMovieRelation.objects.create(user=user, movie=movie, like=True, rate=3)
+
+        self.call('export_movies', self.path('movies.jsonl'), relations=self.path('relations.jsonl'))
+        with open(self.path('movies.jsonl')) as file:
+            exported = [json.loads(line) for line in file]
+        self.assertEqual({'id': movie.id, 'title': 'Loki', 'tagline': 'Glorious Purpose, King',
+                          'description': None, 'year': 2021}, exported[0])
+
+        Movie.objects.all().delete()
+        self.call('import_movies', self.path('movies.jsonl'), relations=self.path('relations.jsonl'))
+
+        self.assertEqual(['Loki', 'Hawkeye'], list(Movie.objects.order_by('id').values_list('title', flat=True)))
+        relation = UserMovieRelation.objects.get()
+        self.assertEqual((user, movie.id, True, 3), (relation.user, relation.movie_id, relation.like, relation.rate))
+        self.assertEqual('3.00', str(Movie.objects.get(id=movie.id).rating))
+
+    def test_03_import_relations_errors(self):
+        user = User.objects.create(username='user1')
+        movie = Movie.objects.create(title='Loki', year=2021)
+        with open(self.path('relations.csv'), 'w') as file:
+            file.write('user,movie,like,in_bookmarks,rate\n'
+                       f'user1,{movie.id},True,False,5\n'
+                       f'usr1,{movie.id},True,False,4\n'
+                       f'user1,{movie.id + 1},True,False,\n'
+                       f'user1,{movie.id},True,False,9\n')
+        with open(self.path('movies.csv'), 'w') as file:
+            file.write('title,year\n')
+
+        stderr = StringIO()
+        with self.assertRaisesMessage(CommandError, '3 relation rows skipped'):
+            call_command('import_movies', self.path('movies.csv'), relations=self.path('relations.csv'),
+                         batch_size=2, stdout=StringIO(), stderr=stderr)
+
+        self.assertIn("line 3: unknown user 'usr1'", stderr.getvalue())
+        self.assertIn(f'line 4: unknown movie {movie.id + 1}', stderr.getvalue())
+        self.assertIn('line 5: ', stderr.getvalue())
+        self.assertEqual([user], list(User.objects.all()))
+        self.assertEqual(5, UserMovieRelation.objects.get().rate)
+        movie.refresh_from_db()
+        self.assertEqual((1, 1, '5.00'), (movie.likes_count, movie.readers_count, str(movie.rating)))
+
+    def test_04_import_movies_errors(self):
+        untouched = Movie.objects.create(title='Echo', year=2023)
+        Movie.objects.filter(pk=untouched.pk).update(likes_count=7)
+        User.objects.create(username='user1')
+        with open(self.path('movies.csv'), 'w') as file:
+            file.write('id,title,year\n'
+                       '10,Loki,2021\n'
+                       '11,Hawkeye,notayear\n'
+                       '12,Marvel One-Shot: All Hail the King,2014\n')
+        with open(self.path('movies.jsonl'), 'w') as file:
+            file.write('{"id": 13, "year": 2021}\n')
+        with open(self.path('relations.csv'), 'w') as file:
+            file.write('user,movie,like,in_bookmarks,rate\n'
+                       'user1,10,True,False,5\n')
+
+        stderr = StringIO()
+        with self.assertRaisesMessage(CommandError, '1 movie rows skipped'):
+            call_command('import_movies', self.path('movies.csv'), relations=self.path('relations.csv'),
+                         batch_size=2, stdout=StringIO(), stderr=stderr)
+        self.assertIn('line 3: ValueError', stderr.getvalue())
+        self.assertEqual(sorted([10, 12, untouched.id]), sorted(Movie.objects.values_list('id', flat=True)))
+        self.assertEqual(1, Movie.objects.get(id=10).likes_count)
+        # Only the movies of the imported relations are recomputed
+        self.assertEqual(7, Movie.objects.get(id=untouched.id).likes_count)
+
+        stderr = StringIO()
+        with self.assertRaisesMessage(CommandError, '1 movie rows skipped'):
+            call_command('import_movies', self.path('movies.jsonl'), stdout=StringIO(), stderr=stderr)
+        self.assertIn("line 1: KeyError('title')", stderr.getvalue())
+
+    def test_05_import_likes_existing_relations(self):
+        user = User.objects.create(username='user1')
+        loki = Movie.objects.create(title='Loki', year=2021)
+        echo = Movie.objects.create(title='Echo', year=2023)
+        UserMovieRelation.objects.create(user=user, movie=loki, like=False, rate=3)
+        UserMovieRelation.objects.create(user=user, movie=echo, like=False)
+        with open(self.path('relations.csv'), 'w') as file:
+            file.write('user,movie,like,in_bookmarks,rate\n'
+                       f'user1,{loki.id},True,False,3\n')
+        with open(self.path('movies.csv'), 'w') as file:
+            file.write('title,year\n')
+
+        self.call('import_movies', self.path('movies.csv'), relations=self.path('relations.csv'))
+
+        relation = UserMovieRelation.objects.get(movie=loki)
+        self.assertTrue(relation.like)
+        self.assertIsNotNone(relation.liked_at)
+        self.assertIsNone(UserMovieRelation.objects.get(movie=echo).liked_at)
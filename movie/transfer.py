@@ -0,0 +1,143 @@
+import csv
+import json
+import sys
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from movie.models import RATE_CHOICES
+
+MOVIE_FIELDS = ('id', 'title', 'tagline', 'description', 'year')
+RELATION_FIELDS = ('user', 'movie', 'like', 'in_bookmarks', 'rate')
+FORMATS = ('csv', 'jsonl')
+
+
+def guess_format(path, default='jsonl'):
+    if path.endswith('.csv'):
+        return 'csv'
+    if path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return default
+
+
+@contextmanager
+def open_file(path, mode):
+    if path == '-':
+        yield sys.stdin if 'r' in mode else sys.stdout
+        return
+    with open(path, mode, newline='', encoding='utf-8') as file:
+        yield file
+
+
+def read_rows(file, fmt):
+    """Rows as dicts, one at a time"""
+    for _, row in read_numbered_rows(file, fmt):
+        yield row
+
+
+def read_numbered_rows(file, fmt):
+    """(line number, row) pairs, for error reports"""
+    if fmt == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(file, 1):
+        if line.strip():
+            yield number, json.loads(line)
+
+
+def write_rows(file, fmt, fields, rows):
+    """Write tuples in `fields` order, returns the number of rows"""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(fields)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(['' if value is None else value for value in row])
+        return count
+    for count, row in enumerate(rows, 1):
+        file.write(json.dumps(dict(zip(fields, row)), ensure_ascii=False))
+        file.write('\n')
+    return count
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _optional(value):
+    return None if value in (None, '') else value
+
+
+def to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 't')
+
+
+def clean_movie(row):
+    movie = {
+        'title': row['title'],
+        'tagline': row.get('tagline') or '',
+        'description': _optional(row.get('description')),
+    }
+    if _optional(row.get('id')) is not None:
+        movie['id'] = int(row['id'])
+    if _optional(row.get('year')) is not None:
+        movie['year'] = int(row['year'])
+    return movie
+
+
+def clean_relation(row):
+    rate = _optional(row.get('rate'))
+    if rate is not None and int(rate) not in dict(RATE_CHOICES):
+        raise ValueError(f'invalid rate {rate!r}')
+    return {
+        'user': str(row['user']),
+        'movie_id': int(row['movie']),
+        'like': to_bool(row.get('like', False)),
+        'in_bookmarks': to_bool(row.get('in_bookmarks', False)),
+        'rate': None if rate is None else int(rate),
+    }
+
+
+class Progress:
+    """Rows/s reporting to a stream (stderr by default, so stdout stays usable for exports)"""
+
+    def __init__(self, stream, label, every=1.0):
+        self.stream, self.label, self.every = stream, label, every
+        self.rows = 0
+        self.started = self.reported = time.perf_counter()
+
+    def add(self, rows):
+        self.rows += rows
+        now = time.perf_counter()
+        if now - self.reported >= self.every:
+            self.reported = now
+            self.stream.write(f'{self.label}: {self.rows} rows ({self.rate:.0f} rows/s)\n')
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return f'{self.label}: {self.rows} rows in {self.elapsed:.2f}s ({self.rate:.0f} rows/s)'
+
+
+def counted(rows, progress, step=1000):
+    """Pass rows through, reporting them to `progress` every `step` rows"""
+    pending = 0
+    for row in rows:
+        yield row
+        pending += 1
+        if pending == step:
+            progress.add(pending)
+            pending = 0
+    progress.add(pending)
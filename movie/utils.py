@@ -1,10 +1,209 @@
-from django.db.models import Avg
+import threading
 
-from movie.models import UserMovieRelation
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, FilteredRelation, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from movie.cache import invalidate
+from movie.models import RATE_CHOICES, Movie, PendingRating, UserMovieRelation, rate_count_field
+
+_pending = threading.local()
 
 
 def set_rating(movie):
     """Rating setting function"""
     rating = UserMovieRelation.objects.filter(movie=movie).aggregate(rating=Avg('rate')).get('rating')
     movie.rating = rating
-    movie.save()
+    movie.save(update_fields=['rating', 'updated_at'])
+
+
+def annotate_user_flags(queryset, user):
+    """
+    `is_liked`, `is_bookmarked` and `my_rate` of `user` on every movie: one LEFT JOIN on
+    the (user, movie) unique index, so no extra query. Anonymous users get no flags.
+    """
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(
+        my_relation=FilteredRelation('usermovierelation', condition=Q(usermovierelation__user=user)),
+        is_liked=Coalesce(F('my_relation__like'), Value(False)),
+        is_bookmarked=Coalesce(F('my_relation__in_bookmarks'), Value(False)),
+        my_rate=F('my_relation__rate'),
+    )
+
+
+def counter_stats(movie_ids):
+    """{movie_id: counters and rating} recomputed from UserMovieRelation in one grouped query"""
+    return {
+        row['movie']: row for row in UserMovieRelation.objects.filter(movie__in=movie_ids).values('movie').annotate(
+            likes_count=Count('id', filter=Q(like=True)),
+            bookmarks_count=Count('id', filter=Q(in_bookmarks=True)),
+            readers_count=Count('id'),
+            rating_sum=Sum('rate', default=0),
+            rating_count=Count('rate'),
+            rating=Avg('rate'),
+            **{rate_count_field(rate): Count('id', filter=Q(rate=rate)) for rate, _ in RATE_CHOICES},
+        ).order_by()
+    }
+
+
+def _movie_batches(movie_ids, batch_size, fields):
+    movies = Movie.objects.order_by('id').only(*fields)
+    if movie_ids is not None:
+        movies = movies.filter(id__in=movie_ids)
+    last_id = 0
+    while True:
+        batch = list(movies.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        if len(batch) < batch_size:
+            return
+        last_id = batch[-1].id
+
+
+def rebuild_counters(movie_ids=None, batch_size=1000):
+    """
+    Recompute the denormalized counters and rating from UserMovieRelation, one grouped query per batch.
+    Each batch locks its movie rows first, so a concurrent `UserMovieRelation.save` either commits
+    before the recompute reads it or applies its F() delta on top of the written values.
+    """
+    movies = Movie.objects.order_by('id').only('id')
+    if movie_ids is not None:
+        movies = movies.filter(id__in=movie_ids)
+
+    updated = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            batch = list(movies.select_for_update().filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                return updated
+            last_id = batch[-1].id
+
+            stats = counter_stats([movie.id for movie in batch])
+            now = timezone.now()
+            for movie in batch:
+                movie.updated_at = now
+                row = stats.get(movie.id, {})
+                for field in Movie.COUNTER_FIELDS:
+                    setattr(movie, field, row.get(field, 0))
+                movie.rating = row.get('rating')
+
+            Movie.objects.bulk_update(batch, [*Movie.COUNTER_FIELDS, 'rating', 'updated_at'])
+        invalidate()
+        updated += len(batch)
+        if len(batch) < batch_size:
+            return updated
+
+
+def check_counters(movie_ids=None, batch_size=1000):
+    """
+    Compare the stored counters with a full recompute without writing anything.
+    Returns {movie_id: {field: (stored, expected)}} for the movies that drifted.
+    """
+    drifted = {}
+    for batch in _movie_batches(movie_ids, batch_size, ['id', *Movie.COUNTER_FIELDS]):
+        stats = counter_stats([movie.id for movie in batch])
+        for movie in batch:
+            row = stats.get(movie.id, {})
+            fields = {field: (getattr(movie, field), row.get(field, 0)) for field in Movie.COUNTER_FIELDS
+                      if getattr(movie, field) != row.get(field, 0)}
+            if fields:
+                drifted[movie.id] = fields
+    return drifted
+
+
+def rating_updates_deferred():
+    return getattr(settings, 'MOVIE_RATING_UPDATES', 'sync') != 'sync'
+
+
+def defer_rating_update(movie_id):
+    """
+    Mark a movie as dirty instead of updating its counters inline.
+    'on_commit' buffers ids in-process and recomputes them when the transaction commits,
+    'queue' stores them in PendingRating for `manage.py flush_pending_ratings`.
+    """
+    if getattr(settings, 'MOVIE_RATING_UPDATES', 'sync') == 'queue':
+        PendingRating.objects.bulk_create([PendingRating(movie_id=movie_id)], ignore_conflicts=True)
+        return
+
+    if not hasattr(_pending, 'movie_ids'):
+        _pending.movie_ids = set()
+    _pending.movie_ids.add(movie_id)
+    # Every save registers a callback, the first one to run drains the buffer for the whole transaction.
+    # Ids left over by a rolled back transaction are picked up by the next commit.
+    transaction.on_commit(flush_deferred_ratings)
+
+
+def flush_deferred_ratings():
+    movie_ids = getattr(_pending, 'movie_ids', None)
+    if not movie_ids:
+        return 0
+    _pending.movie_ids = set()
+    return rebuild_counters(movie_ids)
+
+
+def flush_pending_ratings(batch_size=1000):
+    """Drain the PendingRating queue; rows are deleted before the recompute so later changes get queued again"""
+    flushed = 0
+    while True:
+        with transaction.atomic():
+            movie_ids = list(PendingRating.objects.select_for_update(skip_locked=True).order_by('movie_id')
+                             .values_list('movie_id', flat=True)[:batch_size])
+            if not movie_ids:
+                return flushed
+            PendingRating.objects.filter(movie_id__in=movie_ids).delete()
+            rebuild_counters(movie_ids, batch_size=batch_size)
+        flushed += len(movie_ids)
+
+
+def remember_user_movies(sender, instance, **kwargs):
+    """
+    pre_delete of User: the cascade to UserMovieRelation is a queryset delete that skips
+    UserMovieRelation.delete, so the movies whose counters it changes are noted for after it
+    """
+    instance._relation_movie_ids = list(UserMovieRelation.objects.filter(user=instance)
+                                        .values_list('movie_id', flat=True))
+
+
+def rebuild_user_movies(sender, instance, **kwargs):
+    """post_delete of User: recompute (or defer) the counters of the movies noted by remember_user_movies"""
+    movie_ids = getattr(instance, '_relation_movie_ids', None)
+    if not movie_ids:
+        return
+    if rating_updates_deferred():
+        for movie_id in movie_ids:
+            defer_rating_update(movie_id)
+    else:
+        rebuild_counters(movie_ids)
+
+
+def dedupe_relations():
+    """
+    Merge duplicate (user, movie) relations into the oldest row: like/in_bookmarks if any duplicate
+    has them, the latest non-null rate. Returns the number of rows removed.
+    Runs before the migration that adds the unique constraint, so it only reads and writes the columns
+    the table had before it (id, user, movie, like, in_bookmarks, rate) and leaves the counters alone:
+    run `manage.py rebuild_movie_counters` once migrated.
+    """
+    duplicates = UserMovieRelation.objects.values('user', 'movie').annotate(rows=Count('id')).filter(
+        rows__gt=1).order_by()
+
+    removed = 0
+    with transaction.atomic():
+        for group in duplicates.iterator():
+            relations = list(UserMovieRelation.objects.filter(user=group['user'], movie=group['movie'])
+                             .order_by('id').values_list('id', 'like', 'in_bookmarks', 'rate'))
+            keep, extra = relations[0][0], relations[1:]
+            rates = [rate for _, _, _, rate in relations if rate is not None]
+            UserMovieRelation.objects.filter(pk=keep).update(
+                like=any(like for _, like, _, _ in relations),
+                in_bookmarks=any(in_bookmarks for _, _, in_bookmarks, _ in relations),
+                rate=rates[-1] if rates else None,
+            )
+            # No signals or cascades on UserMovieRelation: a single DELETE ... WHERE id IN
+            removed += UserMovieRelation.objects.filter(pk__in=[pk for pk, *_ in extra]).delete()[0]
+    return removed
@@ -1,27 +1,183 @@
-from django.db.models import Count, Case, When, Avg
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import BigIntegerField, Prefetch, Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.mixins import UpdateModelMixin
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 
-from movie.models import Movie, UserMovieRelation
+from movie.cache import CachedResponseMixin, ConditionalGetMixin
+from movie.filters import FullTextSearchFilter, AnnotationOrderingFilter
+from movie.models import Movie, MovieRanking, MovieSimilarity, UserMovieRelation
+from movie.pagination import RankingPagination
 from movie.permissions import IsStaffOrReadOnly
-from movie.serializers import MoviesSerializer, UserMovieRelationSerializer
+from movie.search import fuzzy_search
+from movie.serializers import BulkRelationItemSerializer, FuzzyMovieSerializer, LibraryEntrySerializer, \
+    MovieDetailSerializer, MovieRankingSerializer, MovieRowSerializer, MoviesSerializer, MovieStatsSerializer, \
+    SimilarMovieSerializer, UserMovieRelationSerializer
+from movie.transfer import chunked
+from movie.utils import annotate_user_flags, rebuild_counters
 
 
-class MovieViewSet(ModelViewSet):
-    queryset = Movie.objects.all().annotate(
-        annotated_likes=Count(Case(When(usermovierelation__like=True, then=1))),
-    ).prefetch_related('readers').order_by('id')
+class MovieViewSet(CachedResponseMixin, ConditionalGetMixin, ModelViewSet):
+    queryset = Movie.objects.all().defer('search_vector').order_by('id')
     serializer_class = MoviesSerializer
 
+    readers_limit = 10
+    max_readers_limit = 100
+    readers_limit_query_param = 'readers_limit'
+
+    export_chunk_size = 500
+
+    fuzzy_limit = 10
+    max_fuzzy_limit = 50
+    fuzzy_budget = 0.2
+
+    max_stats_ids = 100
+
     permission_classes = [IsStaffOrReadOnly]
 
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, AnnotationOrderingFilter]
     filterset_fields = ['year', ]
     search_fields = ['title', 'tagline', ]
-    ordering_fields = ['year', ]
+    ordering_fields = ['year', 'search_rank', ]
+
+    def get_queryset(self):
+        """
+        Only the first `readers_limit` readers of each movie are fetched (one windowed query);
+        the requesting user's flags come from a join in the main query
+        """
+        readers = User.objects.only('username', 'email').order_by('id')
+        limit = self.get_readers_limit()
+        readers = readers[:limit] if limit else readers.none()
+        queryset = annotate_user_flags(super().get_queryset(), self.request.user)
+        return queryset.prefetch_related(Prefetch('readers', queryset=readers, to_attr='limited_readers'))
+
+    def paginate_queryset(self, queryset):
+        # The list is served from values() rows by MovieRowSerializer
+        if self.action == 'list':
+            queryset = MovieRowSerializer.rows(queryset)
+        return super().paginate_queryset(queryset)
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return MovieDetailSerializer
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action == 'list':
+            return MovieRowSerializer(*args, readers_limit=self.get_readers_limit(), **kwargs)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_readers_limit(self):
+        try:
+            limit = int(self.request.query_params[self.readers_limit_query_param])
+        except (KeyError, ValueError):
+            return self.readers_limit
+        return min(max(limit, 0), self.max_readers_limit)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Whole filtered listing as a streamed JSON array (`?output=ndjson` for one object per line).
+        Rows are read with a chunked server-side iterator and serialized one by one,
+        so memory doesn't grow with the result size.
+        """
+        ndjson = request.query_params.get('output') == 'ndjson'
+        queryset = MovieRowSerializer.rows(self.filter_queryset(self.get_queryset()))
+        rows = self.stream_rows(queryset.iterator(chunk_size=self.export_chunk_size))
+        if ndjson:
+            content = (f'{row}\n' for row in rows)
+        else:
+            content = self.stream_array(rows)
+        return StreamingHttpResponse(content, content_type='application/x-ndjson' if ndjson else 'application/json')
+
+    def stream_rows(self, rows):
+        encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        readers_limit = self.get_readers_limit()
+        for chunk in chunked(rows, self.export_chunk_size):
+            for movie in MovieRowSerializer(chunk, readers_limit=readers_limit).data:
+                yield encoder.encode(movie)
+
+    @staticmethod
+    def stream_array(rows):
+        yield '['
+        for index, row in enumerate(rows):
+            yield f',{row}' if index else row
+        yield ']'
+
+    @action(detail=False, methods=['get'])
+    def fuzzy(self, request):
+        """Typo-tolerant title lookup ranked by trigram similarity: /movie/fuzzy/?q=Lokki"""
+        text = request.query_params.get('q', '').strip()
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.fuzzy_limit)), 1), self.max_fuzzy_limit)
+        except ValueError:
+            limit = self.fuzzy_limit
+        movies = fuzzy_search(Movie.objects.defer('search_vector'), text, limit=limit,
+                              budget=self.fuzzy_budget) if text else []
+        return Response({'results': FuzzyMovieSerializer(movies, many=True).data})
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Counters and rating histograms of many movies in one query: /movie/stats/?ids=1,2,3"""
+        try:
+            movie_ids = list(dict.fromkeys(int(movie_id) for movie_id in request.query_params.get('ids', '').split(',')
+                                           if movie_id.strip()))
+            # Ids past the id column overflow when bound to the query
+            if any(abs(movie_id) > BigIntegerField.MAX_BIGINT for movie_id in movie_ids):
+                raise ValueError(movie_ids)
+        except ValueError:
+            raise ValidationError({'ids': ['A comma-separated list of movie ids is required.']})
+        if len(movie_ids) > self.max_stats_ids:
+            raise ValidationError({'ids': [f'At most {self.max_stats_ids} ids per request.']})
+
+        fields = [name for name in MovieStatsSerializer.Meta.fields if name != 'rating_histogram']
+        movies = Movie.objects.filter(id__in=movie_ids).only(*fields, *Movie.RATE_COUNT_FIELDS).order_by('id')
+        return Response({'results': MovieStatsSerializer(movies, many=True).data})
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Top-K neighbours from `manage.py build_similar_movies`: one query on the (movie, rank) index"""
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise NotFound()
+        similar = list(MovieSimilarity.objects.filter(movie_id=pk).select_related('similar').defer(
+            'similar__search_vector').order_by('rank'))
+        if not similar and not Movie.objects.filter(pk=pk).exists():
+            raise NotFound()
+        return Response({'results': SimilarMovieSerializer(similar, many=True).data})
+
+    @action(detail=False, methods=['get'])
+    def top_rated(self, request):
+        """Bayesian-weighted rating leaderboard"""
+        return self.leaderboard('top_rated')
+
+    @action(detail=False, methods=['get'])
+    def most_liked(self, request):
+        return self.leaderboard('most_liked')
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Most likes within MOVIE_TRENDING_DAYS"""
+        return self.leaderboard('trending')
+
+    def leaderboard(self, board):
+        """A page of the precomputed `board` (`manage.py refresh_rankings`), one query on its position index"""
+        queryset = MovieRanking.objects.filter(board=board).select_related('movie').defer(
+            'movie__search_vector').order_by('position')
+        paginator = RankingPagination()
+        page = paginator.paginate_queryset(queryset, self.request, view=self)
+        return paginator.get_paginated_response(MovieRankingSerializer(page, many=True).data)
 
 
 class UserMoviesRelationView(UpdateModelMixin, GenericViewSet):
@@ -30,8 +186,95 @@ class UserMoviesRelationView(UpdateModelMixin, GenericViewSet):
     serializer_class = UserMovieRelationSerializer
     lookup_field = 'movie'
 
+    max_bulk_items = 500
+
+    @staticmethod
+    def locked_relations(user, movie_ids):
+        """{movie_id: relation} of `user`, locked until the end of the transaction"""
+        return {relation.movie_id: relation for relation in UserMovieRelation.objects.select_for_update()
+                .filter(user=user, movie_id__in=movie_ids)}
+
     def get_object(self):
         obj, created = UserMovieRelation.objects.get_or_create(user=self.request.user,
                                                                movie_id=self.kwargs['movie'])
         # print('create', created)
         return obj
+
+    @action(detail=False, methods=['get'])
+    def likes(self, request):
+        return self.library(Q(like=True))
+
+    @action(detail=False, methods=['get'])
+    def bookmarks(self, request):
+        return self.library(Q(in_bookmarks=True))
+
+    @action(detail=False, methods=['get'])
+    def ratings(self, request):
+        return self.library(Q(rate__isnull=False))
+
+    def library(self, condition):
+        """
+        The requesting user's relations matching `condition` with their movies, newest first.
+        One query per page on a per-user partial index, keyset-paginated by relation id.
+        """
+        queryset = UserMovieRelation.objects.filter(condition, user=self.request.user).select_related(
+            'movie').defer('movie__search_vector').order_by('-id')
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(LibraryEntrySerializer(page, many=True).data)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Apply many `{movie, like, in_bookmarks, rate}` changes in one transaction: one read of the
+        user's existing relations, a bulk insert per set of sent fields, one bulk update and one
+        grouped counter rebuild
+        """
+        if isinstance(request.data, list) and len(request.data) > self.max_bulk_items:
+            raise ValidationError(f'At most {self.max_bulk_items} items per request.')
+        serializer = BulkRelationItemSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data
+
+        movie_ids = {item['movie'] for item in items}
+        missing = movie_ids - set(Movie.objects.filter(id__in=movie_ids).values_list('id', flat=True))
+        if missing:
+            raise ValidationError({'movie': [f'Invalid pk "{movie_id}" - object does not exist.'
+                                             for movie_id in sorted(missing)]})
+
+        fields = ['like', 'in_bookmarks', 'rate']
+        now = timezone.now()
+        with transaction.atomic():
+            relations = self.locked_relations(request.user, movie_ids)
+            existing = set(relations)
+            sent = defaultdict(set)
+            for item in items:
+                relation = relations.setdefault(item['movie'], UserMovieRelation(user=request.user,
+                                                                                 movie_id=item['movie']))
+                if 'like' in item and item['like'] != (relation.like and relation.pk is not None):
+                    relation.liked_at = now if item['like'] else None
+                    sent[item['movie']].add('liked_at')
+                for field in fields:
+                    if field in item:
+                        setattr(relation, field, item[field])
+                        sent[item['movie']].add(field)
+                # bulk_update doesn't apply auto_now
+                relation.updated_at = now
+
+            # A relation created by another request since the read conflicts on insert:
+            # only the fields the item sent may overwrite it, the others keep their current value
+            created = defaultdict(list)
+            for movie_id, relation in relations.items():
+                if movie_id not in existing:
+                    created[tuple(field for field in [*fields, 'liked_at'] if field in sent[movie_id])].append(relation)
+            for sent_fields, group in created.items():
+                UserMovieRelation.objects.bulk_create(group, update_conflicts=True, unique_fields=['user', 'movie'],
+                                                      update_fields=[*sent_fields, 'updated_at'])
+            updated = [relation for movie_id, relation in relations.items() if movie_id in existing]
+            if updated:
+                UserMovieRelation.objects.bulk_update(updated, [*fields, 'liked_at', 'updated_at'])
+            if created:
+                relations.update(self.locked_relations(request.user, set(relations) - existing))
+            rebuild_counters(movie_ids)
+
+        ordered = [relations[movie_id] for movie_id in dict.fromkeys(item['movie'] for item in items)]
+        return Response(UserMovieRelationSerializer(ordered, many=True).data)